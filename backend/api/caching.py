@@ -0,0 +1,117 @@
+import hashlib
+import math
+import random
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.response import Response
+
+from foodgram import metrics
+from recipes.versions import get_versions
+
+KEY = 'cached:{}:{}'
+WAIT_STEP = 0.05
+# Чем больше, тем раньше до истечения срока начинается обновление.
+BETA = 1.0
+
+
+def make_key(name, *parts):
+    digest = hashlib.md5(repr(parts).encode()).hexdigest()
+    return KEY.format(name, digest)
+
+
+def get_or_compute(name, key, compute, timeout, stale=None):
+    """Значение из общего кэша с защитой от одновременного пересчёта.
+
+    Запись хранится ещё stale секунд после срока timeout. Пересчитывает
+    её один воркер, взявший блокировку в кэше, остальные тем временем
+    отдают старое значение или ждут новое, если старого нет. Незадолго
+    до истечения срока запись обновляется досрочно с вероятностью,
+    растущей к концу срока и со временем пересчёта, поэтому воркеры
+    не промахиваются все разом.
+    """
+    stale = timeout if stale is None else stale
+    entry = cache.get(key)
+    if entry is not None:
+        value, expires, delta = entry
+        jitter = -delta * BETA * math.log(1 - random.random())
+        if time.time() + jitter < expires:
+            metrics.incr(f'cache.{name}.hits')
+            return value
+    lock = f'{key}:lock'
+    if cache.add(lock, 1, settings.CACHE_LOCK_TIMEOUT):
+        try:
+            start = time.monotonic()
+            value = compute()
+            delta = time.monotonic() - start
+            cache.set(
+                key, (value, time.time() + timeout, delta), timeout + stale
+            )
+        finally:
+            cache.delete(lock)
+        metrics.incr(
+            f'cache.{name}.refreshes' if entry is not None
+            else f'cache.{name}.misses'
+        )
+        return value
+    if entry is not None:
+        metrics.incr(f'cache.{name}.stale')
+        return entry[0]
+    # Значения нет, его считает другой воркер: ждём результат, пока
+    # не истечёт его блокировка.
+    deadline = time.monotonic() + settings.CACHE_LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(WAIT_STEP)
+        entry = cache.get(key)
+        if entry is not None:
+            metrics.incr(f'cache.{name}.waits')
+            return entry[0]
+    metrics.incr(f'cache.{name}.misses')
+    return compute()
+
+
+class Uncacheable(Exception):
+    """Ответ, который нельзя класть в кэш: его отдают как есть."""
+
+    def __init__(self, response):
+        super().__init__(response)
+        self.response = response
+
+
+def cached_action(name, timeout, versions=(), per_user=False):
+    """Кэширует GET-ответы действия вьюсета через get_or_compute.
+
+    Ключ складывается из версий наборов данных versions, аргументов
+    из URL, параметров запроса и, если per_user, пользователя. В кэш
+    попадают только ответы DRF со статусом 200 вместе с заголовками,
+    которые выставило действие, остальные отдаются без кэширования.
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, request, *args, **kwargs):
+            if request.method != 'GET':
+                return method(self, request, *args, **kwargs)
+            key = make_key(
+                name,
+                sorted(get_versions(versions).items()),
+                sorted(kwargs.items()),
+                sorted(request.query_params.lists()),
+                request.user.pk if per_user else None,
+            )
+
+            def compute():
+                response = method(self, request, *args, **kwargs)
+                if (not isinstance(response, Response)
+                        or response.status_code != 200):
+                    raise Uncacheable(response)
+                return response.data, dict(response.items())
+
+            try:
+                data, headers = get_or_compute(name, key, compute, timeout)
+            except Uncacheable as error:
+                return error.response
+            return Response(data, headers=headers)
+        return wrapper
+    return decorator
@@ -1,16 +1,105 @@
+from django import forms
+from django.db.models import Count, Exists, OuterRef, Q
 from django_filters import rest_framework as filters
+from django_filters.widgets import QueryArrayWidget
 
-from recipes.models import Ingredient, Recipe, Tag
+from recipes.lookups import get_tag_map
+from recipes.models import Favorite, Ingredient, Recipe, ShoppingCart
 from users.models import User
 
+TAGS_MODES = (
+    ('any', 'Любой из тэгов'),
+    ('all', 'Все тэги'),
+)
+
+# Интервалы времени приготовления в минутах для фасетов, None — без границы.
+COOKING_TIME_BUCKETS = ((1, 15), (16, 30), (31, 60), (61, None))
+
+
+def filter_by_tags(queryset, slugs, mode='any', field='pk'):
+    """Фильтрует по тэгам полусоединением без размножения строк.
+
+    slug переводятся в id по закэшированной карте тэгов, поэтому в
+    подзапросе участвует только таблица связей рецептов и тэгов.
+    """
+    tag_map = get_tag_map()
+    tag_ids = {tag_map[slug] for slug in slugs if slug in tag_map}
+    tagged = Recipe.tags.through.objects.filter(recipe_id=OuterRef(field))
+    if mode == 'all':
+        if len(tag_ids) < len(set(slugs)):
+            return queryset.none()
+        for tag_id in tag_ids:
+            queryset = queryset.filter(Exists(tagged.filter(tag_id=tag_id)))
+        return queryset
+    if not tag_ids:
+        return queryset.none()
+    return queryset.filter(Exists(tagged.filter(tag_id__in=tag_ids)))
+
+
+def count_facets(queryset, user):
+    """Счётчики фасетов для отфильтрованных рецептов одним запросом.
+
+    Считает рецепты по каждому тэгу, по интервалам времени
+    приготовления и, для пользователя, в избранном и в корзине —
+    всё условными COUNT в одном агрегирующем запросе.
+    """
+    tag_map = get_tag_map()
+    tagged = Recipe.tags.through.objects.filter(recipe_id=OuterRef('pk'))
+    counts = {'total': Count('pk')}
+    for tag_id in tag_map.values():
+        counts[f'tag_{tag_id}'] = Count('pk', filter=Q(
+            Exists(tagged.filter(tag_id=tag_id))))
+    for low, high in COOKING_TIME_BUCKETS:
+        counts[f'time_{low}'] = Count('pk', filter=Q(
+            cooking_time__gte=low) if high is None else Q(
+            cooking_time__range=(low, high)))
+    if user.is_authenticated:
+        counts['is_favorited'] = Count('pk', filter=Q(Exists(
+            Favorite.objects.filter(user=user, recipe=OuterRef('pk')))))
+        counts['is_in_shopping_cart'] = Count('pk', filter=Q(Exists(
+            ShoppingCart.objects.filter(user=user, recipe=OuterRef('pk')))))
+    # На пустом наборе aggregate возвращает None вместо нулей.
+    row = {
+        name: value or 0 for name, value in
+        queryset.order_by().aggregate(**counts).items()
+    }
+    facets = {
+        'total': row['total'],
+        'tags': {
+            slug: row[f'tag_{tag_id}'] for slug, tag_id in tag_map.items()
+        },
+        'cooking_time': [
+            {'min': low, 'max': high, 'count': row[f'time_{low}']}
+            for low, high in COOKING_TIME_BUCKETS
+        ],
+    }
+    for name in ('is_favorited', 'is_in_shopping_cart'):
+        if name in row:
+            facets[name] = row[name]
+    return facets
+
+
+class SlugListField(forms.Field):
+    """Поле со списком slug из ?tags=a&tags=b или ?tags=a,b."""
+    widget = QueryArrayWidget
+
+    def to_python(self, value):
+        return [
+            slug.strip() for item in value or []
+            for slug in item.split(',') if slug.strip()
+        ]
+
+
+class SlugListFilter(filters.Filter):
+    field_class = SlugListField
+
 
 class RecipeFilter(filters.FilterSet):
     """Фильтрсет для рецептов."""
     author = filters.ModelChoiceFilter(queryset=User.objects.all())
-    tags = filters.ModelMultipleChoiceFilter(
-        queryset=Tag.objects.all(),
-        field_name='tags__slug',
-        to_field_name='slug'
+    tags = SlugListFilter(method='get_tags')
+    tags_mode = filters.ChoiceFilter(
+        choices=TAGS_MODES, method='get_tags_mode'
     )
     is_favorited = filters.BooleanFilter(
         method='get_is_favorited'
@@ -21,7 +110,15 @@ class RecipeFilter(filters.FilterSet):
 
     class Meta:
         model = Recipe
-        fields = ('tags', 'author', 'is_favorited', 'is_in_shopping_cart')
+        fields = ('tags', 'tags_mode', 'author',
+                  'is_favorited', 'is_in_shopping_cart')
+
+    def get_tags(self, queryset, name, value):
+        mode = self.form.cleaned_data.get('tags_mode') or 'any'
+        return filter_by_tags(queryset, value, mode)
+
+    def get_tags_mode(self, queryset, name, value):
+        return queryset
 
     def get_is_favorited(self, queryset, name, value):
         if self.request.user.is_authenticated and value:
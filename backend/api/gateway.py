@@ -0,0 +1,42 @@
+import logging
+import threading
+from urllib.error import URLError
+from urllib.request import Request, urlopen
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+TIMEOUT = 5
+
+
+def _send(paths):
+    for path in paths:
+        request = Request(
+            settings.GATEWAY_URL.rstrip('/') + path,
+            headers={
+                'Host': settings.CACHE_PURGE_HOST,
+                'X-Cache-Refresh': settings.CACHE_PURGE_TOKEN,
+            },
+        )
+        try:
+            urlopen(request, timeout=TIMEOUT).close()
+        except URLError as error:
+            if getattr(error, 'code', None) != 404:
+                logger.warning('Не удалось обновить кэш %s: %s',
+                               path, error)
+
+
+def refresh(*paths):
+    """Просит nginx заново закэшировать ответы по путям.
+
+    nginx пропускает такие запросы мимо кэша и сохраняет свежий ответ,
+    поэтому следующий анонимный запрос уже не увидит старые данные.
+    Запросы уходят из фонового потока без повторов, чтобы не задерживать
+    ответ пользователю. Потерянный запрос, например при перезапуске
+    воркера, допустим: запись микрокэша живёт 10 секунд
+    (proxy_cache_valid в nginx.conf) и устареет сама.
+    """
+    if not (settings.GATEWAY_URL and settings.CACHE_PURGE_TOKEN):
+        return
+    threading.Thread(target=_send, args=(paths,), daemon=True).start()
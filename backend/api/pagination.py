@@ -0,0 +1,25 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class SideloadMixin:
+    """Добавляет в ответ блок included компактного списка рецептов."""
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        serializer = getattr(data, 'serializer', None)
+        included = getattr(serializer, 'included', None)
+        if included is not None:
+            response.data['included'] = included
+        return response
+
+
+class RecipePagination(SideloadMixin, PageNumberPagination):
+    """Постраничная выдача рецептов с компактным форматом."""
+
+
+class FeedPagination(SideloadMixin, CursorPagination):
+    """Пагинация ленты по ключу: следующая страница — диапазон индекса."""
+    page_size = settings.REST_FRAMEWORK['PAGE_SIZE']
+    page_size_query_param = 'limit'
+    ordering = '-pub_date'
@@ -0,0 +1,105 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+from foodgram import metrics
+from recipes.lookups import INGREDIENTS_VERSION, TAGS_VERSION
+from recipes.versions import get_versions
+
+
+def recipe_version(pk):
+    return f'recipe:{pk}'
+
+
+def author_version(pk):
+    return f'author:{pk}'
+
+
+def cart_version(user_id):
+    return f'cart:{user_id}'
+
+
+def version_names(recipe_id, author_id):
+    """Наборы данных, от которых зависит общая часть рецепта."""
+    return (
+        TAGS_VERSION,
+        INGREDIENTS_VERSION,
+        author_version(author_id),
+        recipe_version(recipe_id),
+    )
+
+
+class LRUCache:
+    """Ограниченный по размеру словарь, вытесняющий давние записи."""
+
+    def __init__(self, size):
+        self.size = size
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            value = self.items.get(key)
+            if value is not None:
+                self.items.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.items[key] = value
+            self.items.move_to_end(key)
+            while len(self.items) > self.size:
+                self.items.popitem(last=False)
+
+
+_cache = LRUCache(settings.RECIPE_CACHE_SIZE)
+
+
+def get_many(recipes, build):
+    """Общие для всех пользователей представления рецептов по id.
+
+    Ключ записи содержит версии рецепта, автора, тэгов и ингредиентов,
+    поэтому после изменения любого из них запись строится заново.
+    Версии всей страницы читаются из общего кэша одним запросом,
+    недостающие представления строятся одним вызовом build.
+    """
+    versions = get_versions({
+        name for recipe in recipes
+        for name in version_names(recipe.pk, recipe.author_id)
+    })
+    representations, missing, keys = {}, [], {}
+    for recipe in recipes:
+        key = keys[recipe.pk] = (recipe.pk, *(
+            versions[name]
+            for name in version_names(recipe.pk, recipe.author_id)
+        ))
+        data = _cache.get(key)
+        if data is None:
+            missing.append(recipe)
+        else:
+            representations[recipe.pk] = data
+    if missing:
+        for recipe, data in zip(missing, build(missing)):
+            _cache.set(keys[recipe.pk], data)
+            representations[recipe.pk] = data
+    metrics.incr('recipe_cache.hits', len(recipes) - len(missing))
+    metrics.incr('recipe_cache.misses', len(missing))
+    return representations
+
+
+def get_etag(recipe_id, author_id, version, flags):
+    """ETag рецепта для конкретного пользователя.
+
+    Начинается с версии рецепта из БД, по ней проверяется If-Match.
+    Хэш складывает версии автора, тэгов, ингредиентов и флаги
+    пользователя.
+    """
+    names = version_names(recipe_id, author_id)
+    versions = get_versions(names)
+    digest = hashlib.md5(':'.join(
+        [versions[name] for name in names]
+        + [str(int(flag)) for flag in flags]
+    ).encode()).hexdigest()[:16]
+    return f'"{version}-{digest}"'
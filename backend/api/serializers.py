@@ -1,18 +1,56 @@
 import base64
 import webcolors
+from collections import OrderedDict
 
 from django.core.files.base import ContentFile
+from django.db import IntegrityError, transaction
+from django.db.models import F, Manager, Value, prefetch_related_objects
+from django.utils import timezone
 from djoser.serializers import UserCreateSerializer, UserSerializer
 from rest_framework import serializers
 from rest_framework.validators import UniqueTogetherValidator, UniqueValidator
 
-from recipes.models import (Favorite, Ingredient, IngredientsInRecipe, Recipe,
-                            ShoppingCart, Tag)
+from recipes import pantry
+from recipes.models import (Favorite, Follow, Ingredient, IngredientsInRecipe,
+                            Recipe, ShoppingCart, Tag)
+from recipes.versions import bump_on_commit
 from users.models import User
 
+from . import recipe_cache
+from .exceptions import PreconditionFailed
+
 MIN_COOKING_TIME = 1
 MAX_COOKING_TIME = 600
 MIN_AMOUNT_INGREDIENTS = 1
+DUPLICATE_RECIPE = 'Такой рецепт уже есть!'
+
+
+def raise_if_not_duplicate(error):
+    """Пробрасывает ошибку, если нарушен не уникальный индекс хэша рецепта.
+
+    PostgreSQL сообщает имя нарушенного ограничения, SQLite называет
+    поле в тексте ошибки.
+    """
+    diag = getattr(error.__cause__, 'diag', None)
+    constraint = getattr(diag, 'constraint_name', None) or str(error)
+    if 'content_hash' not in constraint:
+        raise error
+
+
+def get_followed_ids(request):
+    """Id авторов из подписок текущего пользователя.
+
+    Загружаются одним запросом и запоминаются в запросе, поэтому все
+    сериализаторы пользователей в ответе обходятся без новых запросов.
+    """
+    if request is None or not request.user.is_authenticated:
+        return frozenset()
+    followed_ids = getattr(request, '_followed_ids', None)
+    if followed_ids is None:
+        followed_ids = frozenset(Follow.objects.filter(
+            user=request.user).values_list('following_id', flat=True))
+        request._followed_ids = followed_ids
+    return followed_ids
 
 
 class Hex2NameColor(serializers.Field):
@@ -51,10 +89,7 @@ class UserSerializer(UserSerializer):
         )
 
     def get_is_subscribed(self, obj):
-        request = self.context.get('request')
-        if (request and request.user.is_authenticated):
-            return obj.following.exists()
-        return False
+        return obj.id in get_followed_ids(self.context.get('request'))
 
 
 class CreateUserSerializer(UserCreateSerializer):
@@ -120,10 +155,7 @@ class FollowSerializer(serializers.ModelSerializer):
                             'recipes', 'recipes_count')
 
     def get_is_subscribed(self, obj):
-        request = self.context.get('request')
-        if (request and request.user.is_authenticated):
-            return obj.following.exists()
-        return False
+        return obj.id in get_followed_ids(self.context.get('request'))
 
     def get_recipes(self, obj):
         request = self.context.get('request')
@@ -198,8 +230,33 @@ class AddIngredientToRecipeSerializer(serializers.ModelSerializer):
         return amount
 
 
-class RecipeReadSerializer(serializers.ModelSerializer):
-    """Сеарилизатор для показа рецепта."""
+def get_recipe_flags(request, recipe_ids):
+    """Id рецептов страницы в избранном и в корзине пользователя.
+
+    Обе таблицы читаются одним запросом через UNION.
+    """
+    favorited, in_cart = set(), set()
+    if request is None or not request.user.is_authenticated:
+        return favorited, in_cart
+    favorites = Favorite.objects.filter(
+        user=request.user, recipe_id__in=recipe_ids
+    ).annotate(cart=Value(False)).values_list(
+        'recipe_id', 'cart').order_by()
+    carts = ShoppingCart.objects.filter(
+        user=request.user, recipe_id__in=recipe_ids
+    ).annotate(cart=Value(True)).values_list(
+        'recipe_id', 'cart').order_by()
+    for recipe_id, cart in favorites.union(carts, all=True):
+        (in_cart if cart else favorited).add(recipe_id)
+    return favorited, in_cart
+
+
+class RecipeSharedSerializer(serializers.ModelSerializer):
+    """Часть рецепта, одинаковая для всех пользователей.
+
+    Строится без запроса в контексте: картинка с относительной ссылкой,
+    автор без подписки.
+    """
     tags = TagSerializer(many=True)
     ingredients = IngredientInRecipeSerializer(
         many=True,
@@ -207,26 +264,114 @@ class RecipeReadSerializer(serializers.ModelSerializer):
     )
     author = UserSerializer()
     image = Base64ImageField()
-    is_favorited = serializers.SerializerMethodField()
-    is_in_shopping_cart = serializers.SerializerMethodField()
-
-    def get_is_favorited(self, obj):
-        request = self.context.get('request')
-        if (request is not None and request.user.is_authenticated):
-            return obj.recipe_favorite.exists()
-        return False
-
-    def get_is_in_shopping_cart(self, obj):
-        request = self.context.get('request')
-        if (request is not None and request.user.is_authenticated):
-            return obj.recipe_shop_cart.exists()
-        return False
 
     class Meta:
         model = Recipe
         fields = ('id', 'tags', 'ingredients', 'author',
-                  'name', 'image', 'text', 'cooking_time',
-                  'is_favorited', 'is_in_shopping_cart')
+                  'name', 'image', 'text', 'cooking_time')
+
+
+def query_flag(request, name):
+    """Включён ли флаг в параметрах запроса: ?name=1 или ?name=true."""
+    return request is not None and request.query_params.get(
+        name, '').lower() in ('1', 'true')
+
+
+def sideload(recipes):
+    """Выносит тэги, авторов и ингредиенты рецептов в блок included.
+
+    В рецептах остаются только id и количества, каждый тэг, автор и
+    ингредиент попадает в included один раз.
+    """
+    tags, authors, ingredients = {}, {}, {}
+    results = []
+    for recipe in recipes:
+        item = OrderedDict(recipe)
+        for tag in recipe['tags']:
+            tags.setdefault(tag['id'], tag)
+        item['tags'] = [tag['id'] for tag in recipe['tags']]
+        authors.setdefault(recipe['author']['id'], recipe['author'])
+        item['author'] = recipe['author']['id']
+        for ingredient in recipe['ingredients']:
+            ingredients.setdefault(ingredient['id'], OrderedDict(
+                id=ingredient['id'],
+                name=ingredient['name'],
+                measurement_unit=ingredient['measurement_unit'],
+            ))
+        item['ingredients'] = [
+            OrderedDict(id=ingredient['id'], amount=ingredient['amount'])
+            for ingredient in recipe['ingredients']
+        ]
+        results.append(item)
+    return results, OrderedDict(
+        tags=list(tags.values()),
+        authors=list(authors.values()),
+        ingredients=list(ingredients.values()),
+    )
+
+
+class RecipeListSerializer(serializers.ListSerializer):
+    """Список рецептов, собранный из кэша одной пачкой.
+
+    В компактном формате связанные объекты лежат в self.included,
+    пагинатор кладёт их рядом с results.
+    """
+    included = None
+
+    def to_representation(self, data):
+        if isinstance(data, Manager):
+            data = data.all()
+        results = self.child.represent(list(data))
+        if query_flag(self.context.get('request'), 'compact'):
+            results, self.included = sideload(results)
+        return results
+
+
+class RecipeReadSerializer(RecipeSharedSerializer):
+    """Сеарилизатор для показа рецепта.
+
+    Общая часть берётся из кэша представлений, флаги пользователя
+    накладываются поверх неё.
+    """
+    is_favorited = serializers.BooleanField(read_only=True)
+    is_in_shopping_cart = serializers.BooleanField(read_only=True)
+
+    class Meta(RecipeSharedSerializer.Meta):
+        fields = RecipeSharedSerializer.Meta.fields + (
+            'is_favorited', 'is_in_shopping_cart'
+        )
+        list_serializer_class = RecipeListSerializer
+
+    def to_representation(self, instance):
+        return self.represent([instance])[0]
+
+    @staticmethod
+    def build_shared(recipes):
+        prefetch_related_objects(
+            recipes, 'author', 'recipe_ingredients__ingredient', 'tags'
+        )
+        return RecipeSharedSerializer(recipes, many=True).data
+
+    def represent(self, recipes):
+        request = self.context.get('request')
+        shared = recipe_cache.get_many(recipes, self.build_shared)
+        favorited, in_cart = get_recipe_flags(
+            request, [recipe.pk for recipe in recipes]
+        )
+        followed_ids = get_followed_ids(request)
+        results = []
+        for recipe in recipes:
+            data = OrderedDict(shared[recipe.pk])
+            data['author'] = OrderedDict(
+                data['author'],
+                is_subscribed=recipe.author_id in followed_ids
+            )
+            if data['image'] and request is not None:
+                data['image'] = request.build_absolute_uri(data['image'])
+            data['is_favorited'] = recipe.pk in favorited
+            data['is_in_shopping_cart'] = recipe.pk in in_cart
+            results.append(data)
+        return results
 
 
 class RecipeCreateSerializer(serializers.ModelSerializer):
@@ -245,13 +390,6 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
             'ingredients', 'image', 'text',
             'cooking_time'
         )
-        validators = [
-            UniqueTogetherValidator(
-                queryset=Recipe.objects.all(),
-                fields=('name', 'text', 'cooking_time'),
-                message='Такой рецепт уже есть!'
-            )
-        ]
 
     def to_representation(self, instance):
         serializer = RecipeReadSerializer(
@@ -263,7 +401,7 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         return serializer.data
 
     def validate(self, data):
-        ingredients = data['ingredients']
+        ingredients = data.get('ingredients', ())
         ing_list = []
         for ingredient in ingredients:
             if ingredient['id'] in ing_list:
@@ -271,6 +409,17 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
                     'Ингридиенты не должны повторяться!'
                 )
             ing_list.append(ingredient['id'])
+        if Ingredient.objects.filter(
+                id__in=ing_list).count() != len(ing_list):
+            raise serializers.ValidationError(
+                'Указан несуществующий ингредиент!'
+            )
+        recipe = Recipe(pk=getattr(self.instance, 'pk', None), **{
+            field: data.get(field, getattr(self.instance, field, None))
+            for field in ('name', 'text', 'cooking_time')
+        })
+        if recipe.is_duplicate():
+            raise serializers.ValidationError(DUPLICATE_RECIPE)
         return data
 
     def validate_cooking_time(self, cooking_time):
@@ -283,35 +432,75 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         return cooking_time
 
     def ingredients_and_tags_for_recipe(self, recipe, ingredients, tags):
-        recipe.tags.set(tags)
-        for ingredient in ingredients:
-            amount = ingredient['amount']
-            current_ingredient = Ingredient.objects.get(id=ingredient['id'])
-            IngredientsInRecipe.objects.create(
+        if tags is not None:
+            recipe.tags.set(tags)
+        if ingredients is None:
+            return
+        stale = IngredientsInRecipe.objects.filter(recipe=recipe)
+        stale._raw_delete(stale.db)
+        IngredientsInRecipe.objects.bulk_create([
+            IngredientsInRecipe(
                 recipe=recipe,
-                ingredient=current_ingredient,
-                amount=amount
+                ingredient_id=ingredient['id'],
+                amount=ingredient['amount']
             )
+            for ingredient in ingredients
+        ])
+        # Массовые операции не шлют сигналы, поэтому версии поднимаются
+        # явно.
+        bump_on_commit(
+            pantry.VERSION, recipe_cache.recipe_version(recipe.pk)
+        )
 
     def create(self, validated_data):
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
-        recipe = Recipe.objects.create(**validated_data)
-        self.ingredients_and_tags_for_recipe(recipe, ingredients, tags)
+        try:
+            with transaction.atomic():
+                recipe = Recipe.objects.create(**validated_data)
+                recipe._version_bumped = True
+                self.ingredients_and_tags_for_recipe(
+                    recipe, ingredients, tags
+                )
+        except IntegrityError as error:
+            # Такой же рецепт создан параллельным запросом.
+            raise_if_not_duplicate(error)
+            raise serializers.ValidationError(DUPLICATE_RECIPE)
         return recipe
 
     def update(self, instance, validated_data):
-        instance.ingredients.clear()
-        instance.tags.clear()
-        ingredients = validated_data.pop('ingredients')
-        tags = validated_data.pop('tags')
-        instance.image = validated_data.get('image', instance.image)
-        instance.name = validated_data.get('name', instance.name)
-        instance.text = validated_data.get('text', instance.text)
-        instance.cooking_time = validated_data.get(
-            'cooking_time', instance.cooking_time)
-        self.ingredients_and_tags_for_recipe(instance, ingredients, tags)
-        instance.save()
+        """Обновляет рецепт, если его версия совпала с ожидаемой.
+
+        expected_versions приходят из If-Match. Условный UPDATE версии
+        идёт первым: он и проверяет условие без отдельного чтения, и
+        блокирует строку рецепта до конца транзакции.
+        """
+        expected_versions = validated_data.pop('expected_versions', None)
+        ingredients = validated_data.pop('ingredients', None)
+        tags = validated_data.pop('tags', None)
+        try:
+            with transaction.atomic():
+                recipes = Recipe.objects.filter(pk=instance.pk)
+                if expected_versions is not None:
+                    recipes = recipes.filter(version__in=expected_versions)
+                if not recipes.update(
+                        version=F('version') + 1, updated_at=timezone.now()):
+                    raise PreconditionFailed()
+                instance._version_bumped = True
+                instance.image = validated_data.get('image', instance.image)
+                instance.name = validated_data.get('name', instance.name)
+                instance.text = validated_data.get('text', instance.text)
+                instance.cooking_time = validated_data.get(
+                    'cooking_time', instance.cooking_time)
+                self.ingredients_and_tags_for_recipe(
+                    instance, ingredients, tags
+                )
+                instance.save(
+                    update_fields=['image', 'name', 'text', 'cooking_time']
+                )
+        except IntegrityError as error:
+            raise_if_not_duplicate(error)
+            raise serializers.ValidationError(DUPLICATE_RECIPE)
         return instance
 
 
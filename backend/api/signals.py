@@ -0,0 +1,72 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from recipes.lookups import INGREDIENTS_VERSION, TAGS_VERSION
+from recipes.models import (Ingredient, IngredientsInRecipe, Recipe,
+                            ShoppingCart, Tag)
+from recipes.versions import bump_on_commit
+from users.models import User
+
+from . import gateway, recipe_cache
+
+
+def refresh_on_commit(*paths):
+    transaction.on_commit(partial(gateway.refresh, *paths))
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def recipe_changed(sender, instance, **kwargs):
+    bump_on_commit(recipe_cache.recipe_version(instance.pk))
+    refresh_on_commit(f'/api/recipes/{instance.pk}/', '/api/recipes/')
+
+
+@receiver(post_save, sender=IngredientsInRecipe)
+@receiver(post_delete, sender=IngredientsInRecipe)
+def recipe_ingredients_changed(sender, instance, **kwargs):
+    bump_on_commit(recipe_cache.recipe_version(instance.recipe_id))
+
+
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_relations_changed(sender, instance, action, reverse, pk_set,
+                             **kwargs):
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        bump_on_commit(recipe_cache.recipe_version(instance.pk))
+    elif pk_set:
+        bump_on_commit(*map(recipe_cache.recipe_version, pk_set))
+    else:
+        bump_on_commit(TAGS_VERSION, INGREDIENTS_VERSION)
+
+
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_delete, sender=ShoppingCart)
+def cart_changed(sender, instance, **kwargs):
+    bump_on_commit(recipe_cache.cart_version(instance.user_id))
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def tag_changed(sender, instance, **kwargs):
+    refresh_on_commit(f'/api/tags/{instance.pk}/', '/api/tags/')
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def ingredient_changed(sender, instance, **kwargs):
+    bump_on_commit(INGREDIENTS_VERSION)
+    refresh_on_commit(f'/api/ingredients/{instance.pk}/')
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) == {'last_login'}:
+        return
+    bump_on_commit(recipe_cache.author_version(instance.pk))
+    refresh_on_commit(f'/api/users/{instance.pk}/', '/api/users/')
@@ -0,0 +1,175 @@
+import re
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import TestCase
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from recipes.models import (Favorite, FeedEntry, Follow, Ingredient,
+                            IngredientsInRecipe, Recipe, ShoppingCart, Tag)
+from users.models import User
+
+from .views import RecipeViewSet
+
+LARGE_TABLES = (
+    'recipes_recipe',
+    'recipes_recipe_tags',
+    'recipes_ingredientsinrecipe',
+    'recipes_favorite',
+    'recipes_shoppingcart',
+    'recipes_follow',
+    'recipes_feedentry',
+)
+SEQ_SCAN = re.compile(r'Seq Scan on (\w+)')
+
+RECIPE_LIST_QUERIES = (
+    '',
+    'author={author}',
+    'tags={tag}',
+    'tags={tag}&tags_mode=all',
+    'is_favorited=1',
+    'is_in_shopping_cart=1',
+    'tags={tag}&is_favorited=1&author={author}',
+)
+# Запросы, которые считают заметную долю таблицы: для них полное
+# сканирование — честный выбор планировщика, проверяется только
+# страница.
+PAGE_ONLY_QUERIES = ('', 'tags={tag}', 'tags={tag}&tags_mode=all')
+
+AUTHORS = 100
+RECIPES_PER_AUTHOR = 100
+READERS = 100
+INGREDIENTS = 500
+INGREDIENTS_PER_RECIPE = 5
+SAVED_PER_READER = 30
+FOLLOWED_PER_READER = 20
+FEED_PER_READER = 200
+
+
+@skipUnless(connection.vendor == 'postgresql',
+            'Планы запросов проверяются на PostgreSQL')
+class QueryPlanTest(TestCase):
+    """Горячие запросы не сканируют большие таблицы целиком.
+
+    Данные создаются в объёме, при котором планировщик с настройками
+    по умолчанию предпочитает индекс полному сканированию.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.bulk_create([
+            User(username=f'user{number}', email=f'user{number}@test.ru')
+            for number in range(AUTHORS + READERS)
+        ])
+        users = list(User.objects.order_by('pk'))
+        authors, readers = users[:AUTHORS], users[AUTHORS:]
+        cls.author, cls.reader = authors[0], readers[0]
+        tags = Tag.objects.bulk_create([
+            Tag(name=slug, color=color, slug=slug) for slug, color in (
+                ('breakfast', '#E26C2D'), ('lunch', '#49B64E'),
+                ('dinner', '#8775D2'),
+            )
+        ])
+        cls.tag = tags[0].slug
+        Ingredient.objects.bulk_create([
+            Ingredient(name=f'ингредиент {number}', measurement_unit='г')
+            for number in range(INGREDIENTS)
+        ])
+        ingredient_ids = list(
+            Ingredient.objects.order_by('pk').values_list('pk', flat=True)
+        )
+        recipes = []
+        for author in authors:
+            for number in range(RECIPES_PER_AUTHOR):
+                name = f'Рецепт {number} от {author.username}'
+                recipes.append(Recipe(
+                    author=author, name=name, text=name, cooking_time=10,
+                    image='recipes/images/test.png',
+                    content_hash=Recipe.content_digest(name, name, 10),
+                ))
+        Recipe.objects.bulk_create(recipes, batch_size=1000)
+        recipe_ids = list(
+            Recipe.objects.order_by('pk').values_list('pk', flat=True)
+        )
+        Recipe.tags.through.objects.bulk_create([
+            Recipe.tags.through(
+                recipe_id=recipe_id, tag_id=tags[index % len(tags)].pk
+            )
+            for index, recipe_id in enumerate(recipe_ids)
+        ], batch_size=1000)
+        IngredientsInRecipe.objects.bulk_create([
+            IngredientsInRecipe(
+                recipe_id=recipe_id,
+                ingredient_id=ingredient_ids[
+                    (index * INGREDIENTS_PER_RECIPE + shift) % INGREDIENTS
+                ],
+                amount=1,
+            )
+            for index, recipe_id in enumerate(recipe_ids)
+            for shift in range(INGREDIENTS_PER_RECIPE)
+        ], batch_size=1000)
+        for model in (Favorite, ShoppingCart):
+            model.objects.bulk_create([
+                model(
+                    user=reader,
+                    recipe_id=recipe_ids[(index * 97 + saved) % len(
+                        recipe_ids)],
+                )
+                for index, reader in enumerate(readers)
+                for saved in range(SAVED_PER_READER)
+            ], batch_size=1000)
+        Follow.objects.bulk_create([
+            Follow(user=reader, following=authors[
+                (index + followed) % AUTHORS])
+            for index, reader in enumerate(readers)
+            for followed in range(FOLLOWED_PER_READER)
+        ], batch_size=1000)
+        recipes = Recipe.objects.order_by('pk')
+        FeedEntry.objects.bulk_create([
+            FeedEntry(
+                user=reader, author_id=recipe.author_id, recipe=recipe,
+                pub_date=recipe.pub_date,
+            )
+            for index, reader in enumerate(readers)
+            for recipe in recipes[index * 50:index * 50 + FEED_PER_READER]
+        ], batch_size=1000)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def assertIndexed(self, queryset):
+        plan = queryset.explain()
+        tables = set(SEQ_SCAN.findall(plan)) & set(LARGE_TABLES)
+        self.assertFalse(tables, plan)
+
+    def recipe_list(self, query):
+        """Queryset списка рецептов так, как его строит вьюсет."""
+        request = Request(APIRequestFactory().get(f'/api/recipes/?{query}'))
+        request.user = self.reader
+        view = RecipeViewSet(
+            request=request, action='list', format_kwarg=None,
+            args=(), kwargs={}
+        )
+        return view.filter_queryset(view.get_queryset())
+
+    def test_recipe_list(self):
+        for template in RECIPE_LIST_QUERIES:
+            query = template.format(author=self.author.pk, tag=self.tag)
+            queryset = self.recipe_list(query)
+            with self.subTest(query=query, part='page'):
+                self.assertIndexed(queryset[:6])
+            if template in PAGE_ONLY_QUERIES:
+                continue
+            with self.subTest(query=query, part='count'):
+                self.assertIndexed(queryset.order_by().values('pk'))
+
+    def test_cart_ingredients(self):
+        self.assertIndexed(RecipeViewSet.get_cart_ingredients(self.reader))
+
+    def test_followers(self):
+        self.assertIndexed(
+            Follow.objects.filter(following=self.author).values('user_id')
+        )
+
+    def test_feed(self):
+        self.assertIndexed(FeedEntry.objects.filter(user=self.reader)[:6])
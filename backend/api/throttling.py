@@ -0,0 +1,95 @@
+import time
+from contextlib import contextmanager
+
+from rest_framework.throttling import SimpleRateThrottle
+
+from foodgram import metrics
+
+LOCK_ATTEMPTS = 20
+LOCK_WAIT = 0.005
+LOCK_TIMEOUT = 1
+
+
+def get_cost(view):
+    """Стоимость действия в токенах из throttle_costs вьюсета.
+
+    Действия без стоимости бесплатны и не ограничиваются.
+    """
+    costs = getattr(view, 'throttle_costs', {})
+    return costs.get(getattr(view, 'action', None), 0)
+
+
+class TokenBucketThrottle(SimpleRateThrottle):
+    """Token bucket в общем кэше всех воркеров.
+
+    Частота из DEFAULT_THROTTLE_RATES задаёт ёмкость ведра и скорость
+    пополнения: '60/min' — 60 токенов, один токен в секунду. Запрос
+    списывает столько токенов, сколько стоит действие.
+    """
+    cache_format = 'throttle:%(scope)s:%(ident)s'
+
+    def allow_request(self, request, view):
+        cost = get_cost(view)
+        if not cost or self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+        capacity = self.num_requests
+        self.refill = capacity / self.duration
+        cost = min(cost, capacity)
+        with self.locked():
+            now = self.timer()
+            tokens, updated = self.cache.get(self.key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * self.refill)
+            if tokens >= cost:
+                self.cache.set(self.key, (tokens - cost, now), self.duration)
+                return True
+        self.deficit = cost - tokens
+        metrics.incr(f'throttle.{self.scope}.rejected')
+        return False
+
+    @contextmanager
+    def locked(self):
+        """Короткая блокировка ведра через cache.add.
+
+        Если блокировку не удалось взять, ведро обновляется без неё:
+        лишний пропущенный запрос лучше зависшего воркера.
+        """
+        lock = f'{self.key}:lock'
+        for _ in range(LOCK_ATTEMPTS):
+            if self.cache.add(lock, 1, LOCK_TIMEOUT):
+                break
+            time.sleep(LOCK_WAIT)
+        else:
+            yield
+            return
+        try:
+            yield
+        finally:
+            self.cache.delete(lock)
+
+    def wait(self):
+        return self.deficit / self.refill
+
+
+class UserBucketThrottle(TokenBucketThrottle):
+    """Ведро пользователя, для анонимов — ведро адреса."""
+    scope = 'user'
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            ident = request.user.pk
+        else:
+            ident = self.get_ident(request)
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
+
+
+class IPBucketThrottle(TokenBucketThrottle):
+    """Общее ведро адреса для всех его пользователей и токенов."""
+    scope = 'ip'
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {
+            'scope': self.scope, 'ident': self.get_ident(request)
+        }
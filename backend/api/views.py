@@ -1,31 +1,69 @@
-from django.db.models import Sum
+from django.conf import settings
+from django.db.models import Exists, OuterRef, Sum
+from django.http import Http404
 from django.http.response import HttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.pagination import PageNumberPagination
-from rest_framework.permissions import (AllowAny, IsAuthenticated,
+from rest_framework.permissions import (AllowAny, IsAdminUser,
+                                        IsAuthenticated,
                                         IsAuthenticatedOrReadOnly)
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
-from recipes.models import (Favorite, Follow, Ingredient, IngredientsInRecipe,
-                            Recipe, ShoppingCart, Tag)
+from foodgram import metrics
+from recipes import catalog, pantry
+from recipes.lookups import INGREDIENTS_VERSION, get_tag_map
+from recipes.models import (Favorite, FeedEntry, Follow, Ingredient,
+                            IngredientsInRecipe, Recipe, RecipePopularity,
+                            ShoppingCart, SimilarRecipe, Tag)
+from recipes.versions import get_versions
+from users import deletion
 from users.models import User
 
-from .filters import IngredientFilter, RecipeFilter
+from . import recipe_cache
+from .caching import cached_action, get_or_compute, make_key
+from .filters import (IngredientFilter, RecipeFilter, count_facets,
+                      filter_by_tags)
+from .pagination import FeedPagination, RecipePagination
 from .permissions import IsAuthorOrReadOnly
 from .serializers import (FollowSerializer, IngredientSerializer,
                           RecipeCreateSerializer, RecipeMiniFieldSerializer,
-                          RecipeReadSerializer, TagSerializer, UserSerializer)
+                          RecipeReadSerializer, TagSerializer, UserSerializer,
+                          query_flag)
+
+
+def parse_ids(values):
+    """Список id из ?name=1,2&name=3, ValueError при нечисловых id."""
+    return [int(pk) for value in values for pk in value.split(',') if pk]
+
+
+def get_row_or_404(table, pk):
+    """Строка таблицы каталога по id из URL."""
+    try:
+        row = table.get(int(pk))
+    except ValueError:
+        raise Http404
+    if row is None:
+        raise Http404
+    return row
 
 
 class UserViewSet(UserViewSet):
-    queryset = User.objects.all()
+    queryset = User.objects.filter(deletion_requested__isnull=True)
     permission_classes = (IsAuthenticatedOrReadOnly, )
     pagination_class = PageNumberPagination
     serializer_class = UserSerializer
+    throttle_costs = {'list': 2}
+
+    def perform_destroy(self, instance):
+        deletion.request_deletion(instance)
 
     @action(
         detail=True,
@@ -34,7 +72,7 @@ class UserViewSet(UserViewSet):
         permission_classes=(IsAuthenticated,)
     )
     def follow(self, request, id):
-        following = get_object_or_404(User, id=id)
+        following = get_object_or_404(self.get_queryset(), id=id)
         if request.method == 'POST':
             if Follow.objects.filter(user=request.user,
                                      following=following).exists():
@@ -63,7 +101,9 @@ class UserViewSet(UserViewSet):
             url_path='subscriptions',
             permission_classes=(AllowAny,))
     def follows(self, request):
-        queryset = User.objects.filter(following__user=request.user)
+        queryset = User.objects.filter(
+            following__user=request.user, deletion_requested__isnull=True
+        )
         pages = self.paginate_queryset(queryset)
         serializer = FollowSerializer(
             pages, many=True, context={'request': request}
@@ -81,6 +121,20 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     search_fields = ('^name', )
     pagination_class = None
 
+    @cached_action('ingredients', settings.CATALOG_CACHE_TIMEOUT,
+                   versions=(catalog.VERSION,))
+    def list(self, request, *args, **kwargs):
+        ingredients = catalog.get_catalog().ingredients
+        name = request.query_params.get('name')
+        return Response(
+            ingredients.search(name) if name else ingredients.all()
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return Response(
+            get_row_or_404(catalog.get_catalog().ingredients, kwargs['pk'])
+        )
+
 
 class TagViewSet(viewsets.ReadOnlyModelViewSet):
     """Вьюсет для TagSerializer."""
@@ -89,6 +143,16 @@ class TagViewSet(viewsets.ReadOnlyModelViewSet):
     permission_classes = (AllowAny, )
     pagination_class = None
 
+    @cached_action('tags', settings.CATALOG_CACHE_TIMEOUT,
+                   versions=(catalog.VERSION,))
+    def list(self, request, *args, **kwargs):
+        return Response(catalog.get_catalog().tags.all())
+
+    def retrieve(self, request, *args, **kwargs):
+        return Response(
+            get_row_or_404(catalog.get_catalog().tags, kwargs['pk'])
+        )
+
 
 class RecipeViewSet(viewsets.ModelViewSet):
     """Вьюсет для RecipeSerializer."""
@@ -96,26 +160,218 @@ class RecipeViewSet(viewsets.ModelViewSet):
     permission_classes = (IsAuthorOrReadOnly,)
     filter_backends = (DjangoFilterBackend, )
     filterset_class = RecipeFilter
+    pagination_class = RecipePagination
     serializer_class = RecipeReadSerializer
+    throttle_costs = {
+        'create': 5,
+        'update': 5,
+        'partial_update': 5,
+        'download_cart': 10,
+        'batch': 2,
+    }
 
     def perform_create(self, serializer):
         return serializer.save(author=self.request.user)
 
+    def perform_update(self, serializer):
+        serializer.save(expected_versions=self.get_expected_versions())
+
+    def get_expected_versions(self):
+        """Версии рецепта из If-Match или None, если условия нет."""
+        header = self.request.META.get('HTTP_IF_MATCH')
+        if not header:
+            return None
+        etags = parse_etags(header)
+        if '*' in etags:
+            return None
+        # If-Match сравнивает только сильные ETag, слабые не совпадут.
+        return [
+            int(version) for version, _, _ in (
+                etag.strip('"').partition('-') for etag in etags
+                if not etag.startswith('W/')
+            ) if version.isdigit()
+        ]
+
+    def get_etag(self, pk):
+        """ETag рецепта одним запросом: версия, автор и флаги."""
+        user = self.request.user
+        try:
+            queryset = self.get_queryset().filter(pk=pk)
+        except (TypeError, ValueError):
+            raise Http404
+        fields = ['id', 'version', 'author_id']
+        if user.is_authenticated:
+            queryset = queryset.annotate(
+                favorited=Exists(Favorite.objects.filter(
+                    user=user, recipe=OuterRef('pk'))),
+                in_cart=Exists(ShoppingCart.objects.filter(
+                    user=user, recipe=OuterRef('pk'))),
+                subscribed=Exists(Follow.objects.filter(
+                    user=user, following=OuterRef('author_id'))),
+            )
+            fields += ['favorited', 'in_cart', 'subscribed']
+        row = next(iter(queryset.values_list(*fields)[:1]), None)
+        if row is None:
+            raise Http404
+        recipe_id, version, author_id, *flags = row
+        return recipe_cache.get_etag(recipe_id, author_id, version, flags)
+
+    def retrieve(self, request, *args, **kwargs):
+        etag = self.get_etag(kwargs['pk'])
+        etags = parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+        if etag in etags or '*' in etags:
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = super().retrieve(request, *args, **kwargs)
+        response['ETag'] = etag
+        # Флаги в ETag зависят от пользователя.
+        patch_vary_headers(response, ('Authorization',))
+        return response
+
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        if query_flag(request, 'facets'):
+            response.data['facets'] = count_facets(
+                self.filter_queryset(self.get_queryset()), request.user
+            )
+        return response
+
     def get_serializer_class(self):
-        if self.action in ['list', 'retrive']:
+        if self.action in ['list', 'retrieve']:
             return RecipeReadSerializer
         return RecipeCreateSerializer
 
     def get_queryset(self):
-        recipe = Recipe.objects.prefetch_related(
-            'recipe_ingredients__ingredient', 'tags'
-        ).all()
-        return recipe
+        # Тэги и ингредиенты догружаются только для рецептов, которых
+        # нет в кэше представлений.
+        return Recipe.objects.select_related('author').filter(
+            author__deletion_requested__isnull=True
+        )
+
+    @action(detail=False, methods=['GET'],
+            permission_classes=(IsAuthenticated,),
+            pagination_class=FeedPagination)
+    def feed(self, request):
+        """Лента рецептов от авторов из подписок."""
+        queryset = FeedEntry.objects.filter(
+            user=request.user, recipe__author__deletion_requested__isnull=True
+        ).select_related('recipe__author')
+        pages = self.paginate_queryset(queryset)
+        serializer = RecipeReadSerializer(
+            [entry.recipe for entry in pages],
+            many=True, context={'request': request}
+        )
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=['GET'], permission_classes=(AllowAny,))
+    def popular(self, request):
+        """Популярные рецепты из заранее посчитанного рейтинга."""
+        queryset = RecipePopularity.objects.filter(
+            recipe__author__deletion_requested__isnull=True
+        ).select_related('recipe__author')
+        tags = request.query_params.getlist('tags')
+        if tags:
+            queryset = filter_by_tags(
+                queryset, tags, request.query_params.get('tags_mode'),
+                field='recipe_id'
+            )
+        pages = self.paginate_queryset(queryset)
+        serializer = RecipeReadSerializer(
+            [row.recipe for row in pages],
+            many=True, context={'request': request}
+        )
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=True, methods=['GET'], permission_classes=(AllowAny,),
+            pagination_class=None)
+    def similar(self, request, pk=None):
+        """Похожие рецепты из заранее посчитанной таблицы соседей."""
+        recipe = get_object_or_404(self.get_queryset(), id=pk)
+        similar = SimilarRecipe.objects.filter(
+            recipe=recipe, similar__author__deletion_requested__isnull=True
+        ).select_related('similar').order_by('-score')
+        serializer = RecipeMiniFieldSerializer(
+            [row.similar for row in similar],
+            many=True, context={'request': request}
+        )
+        return Response(serializer.data)
+
+    @action(detail=False, methods=['GET'], permission_classes=(AllowAny,),
+            pagination_class=None)
+    def batch(self, request):
+        """Несколько рецептов по списку id одним запросом.
+
+        Порядок рецептов совпадает с порядком id, не найденные id
+        перечислены в missing.
+        """
+        try:
+            ids = list(dict.fromkeys(
+                parse_ids(request.query_params.getlist('ids'))
+            ))
+        except ValueError:
+            raise ValidationError({'ids': 'Ожидается список id рецептов.'})
+        if not ids:
+            raise ValidationError({'ids': 'Укажите хотя бы один рецепт.'})
+        if len(ids) > settings.RECIPE_BATCH_LIMIT:
+            raise ValidationError({'ids': (
+                f'Не больше {settings.RECIPE_BATCH_LIMIT} рецептов '
+                'за запрос.'
+            )})
+        recipes = self.get_queryset().in_bulk(ids)
+        serializer = RecipeReadSerializer(
+            [recipes[pk] for pk in ids if pk in recipes],
+            many=True, context={'request': request}
+        )
+        data = {
+            'results': serializer.data,
+            'missing': [pk for pk in ids if pk not in recipes],
+        }
+        if serializer.included is not None:
+            data['included'] = serializer.included
+        return Response(data)
+
+    @action(detail=False, methods=['GET'], permission_classes=(AllowAny,))
+    def pantry(self, request):
+        """Рецепты, которые можно приготовить из имеющихся ингредиентов."""
+        try:
+            ingredient_ids = parse_ids(
+                request.query_params.getlist('ingredients')
+            )
+        except ValueError:
+            raise ValidationError(
+                {'ingredients': 'Ожидается список id ингредиентов.'}
+            )
+        if not ingredient_ids:
+            raise ValidationError(
+                {'ingredients': 'Укажите хотя бы один ингредиент.'}
+            )
+        tag_ids = None
+        tags = request.query_params.getlist('tags')
+        if tags:
+            tag_map = get_tag_map()
+            tag_ids = [tag_map.get(slug, 0) for slug in tags]
+        recipes, coverage, missing = pantry.get_index().search(
+            ingredient_ids, tag_ids, request.query_params.get('tags_mode')
+        )
+        ranking = {
+            recipe_id: (share, lack) for recipe_id, share, lack in zip(
+                recipes.tolist(), coverage.tolist(), missing.tolist())
+        }
+        page_ids = self.paginate_queryset(recipes.tolist())
+        page = self.get_queryset().in_bulk(page_ids)
+        serializer = RecipeReadSerializer(
+            [page[pk] for pk in page_ids if pk in page],
+            many=True, context={'request': request}
+        )
+        data = serializer.data
+        for item in data:
+            item['coverage'], item['missing'] = ranking[item['id']]
+        return self.get_paginated_response(data)
 
     @action(detail=True, methods=('POST', 'DELETE'),
             permission_classes=(IsAuthenticated,))
     def favorite(self, request, pk=None):
-        recipe = get_object_or_404(Recipe, id=pk)
+        recipe = get_object_or_404(self.get_queryset(), id=pk)
         if request.method == 'POST':
             if Favorite.objects.filter(user=request.user,
                                        recipe=recipe).exists():
@@ -137,7 +393,7 @@ class RecipeViewSet(viewsets.ModelViewSet):
             permission_classes=(IsAuthenticated,),
             pagination_class=None)
     def cart(self, request, pk=None):
-        recipe = get_object_or_404(Recipe, id=pk)
+        recipe = get_object_or_404(self.get_queryset(), id=pk)
         if request.method == 'POST':
             if ShoppingCart.objects.filter(user=request.user,
                                            recipe=recipe).exists():
@@ -155,15 +411,29 @@ class RecipeViewSet(viewsets.ModelViewSet):
             ).delete()
             return Response(status=status.HTTP_204_NO_CONTENT)
 
+    @staticmethod
+    def get_cart_ingredients(user):
+        """Суммы ингредиентов из рецептов в корзине пользователя."""
+        return IngredientsInRecipe.objects.filter(
+            recipe__recipe_shop_cart__user=user).values(
+            'ingredient__name', 'ingredient__measurement_unit').annotate(
+            amount=Sum('amount'))
+
     @action(detail=False, methods=['GET'],
             url_path='download_shopping_cart',
             permission_classes=[IsAuthenticated, ])
     def download_cart(self, request):
         """Отправка файла со списком покупок."""
-        ingredients = IngredientsInRecipe.objects.filter(
-            recipe__recipe_shop_cart__user=request.user).values(
-            'ingredient__name', 'ingredient__measurement_unit').annotate(
-            amount=Sum('amount'))
+        user = request.user
+        ingredients = get_or_compute(
+            'cart', make_key('cart', sorted(get_versions((
+                recipe_cache.cart_version(user.pk),
+                INGREDIENTS_VERSION,
+                pantry.VERSION,
+            )).items())),
+            lambda: list(self.get_cart_ingredients(user)),
+            settings.CART_CACHE_TIMEOUT,
+        )
         download_cart_list = ('Mans-foodgram.\n'
                               'Ингредиенты:\n')
         for ingredient in ingredients:
@@ -176,3 +446,17 @@ class RecipeViewSet(viewsets.ModelViewSet):
         response['Content-Disposition'] = \
             'attachment; filename="shopping_cart.txt"'
         return response
+
+
+class MetricsView(APIView):
+    """Счётчики производительности для администраторов."""
+    permission_classes = (IsAdminUser, )
+
+    def get(self, request):
+        counters = metrics.snapshot()
+        replica = counters.get('db.reads.replica', 0)
+        reads = replica + counters.get('db.reads.primary', 0)
+        counters['db.reads.replica_share'] = (
+            round(replica / reads, 3) if reads else None
+        )
+        return Response(counters)
@@ -0,0 +1,144 @@
+import hashlib
+import logging
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import (DatabaseError, InterfaceError, OperationalError,
+                       connections)
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+PIN_KEY = 'db-pin:{}'
+LAG_QUERY = (
+    'SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() '
+    'THEN 0 ELSE EXTRACT(EPOCH FROM now() - '
+    'pg_last_xact_replay_timestamp()) END'
+)
+
+_state = threading.local()
+_health = {}
+
+
+def replica_aliases():
+    return [alias for alias in settings.DATABASES if alias != 'default']
+
+
+def replica_is_healthy(alias):
+    """Реплика доступна и отстаёт не больше REPLICA_MAX_LAG секунд.
+
+    Результат проверки запоминается в воркере на REPLICA_CHECK_INTERVAL.
+    """
+    checked, healthy = _health.get(alias, (0, False))
+    if time.monotonic() - checked < settings.REPLICA_CHECK_INTERVAL:
+        return healthy
+    connection = connections[alias]
+    try:
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(LAG_QUERY)
+                lag = cursor.fetchone()[0] or 0
+        else:
+            connection.ensure_connection()
+            lag = 0
+        healthy = lag <= settings.REPLICA_MAX_LAG
+        if not healthy:
+            logger.warning('Реплика %s отстаёт на %s с', alias, lag)
+    except DatabaseError:
+        logger.exception('Реплика %s недоступна', alias)
+        healthy = False
+    _health[alias] = (time.monotonic(), healthy)
+    return healthy
+
+
+def mark_unhealthy(alias):
+    """Не читать с реплики до следующей проверки."""
+    _health[alias] = (time.monotonic(), False)
+
+
+def pin_key(request):
+    """Ключ закрепления за основной БД: токен или сессия клиента."""
+    credentials = (request.META.get('HTTP_AUTHORIZATION')
+                   or request.COOKIES.get(settings.SESSION_COOKIE_NAME))
+    if not credentials:
+        return None
+    return PIN_KEY.format(hashlib.sha256(credentials.encode()).hexdigest())
+
+
+class ReplicaRouter:
+    """Отправляет чтения безопасных запросов API на реплики."""
+
+    def db_for_read(self, model, **hints):
+        if not getattr(_state, 'use_replica', False):
+            return None
+        healthy = [
+            alias for alias in replica_aliases()
+            if replica_is_healthy(alias)
+        ]
+        if not healthy:
+            _state.use_replica = False
+            return None
+        alias = getattr(_state, 'replica', None)
+        if alias not in healthy:
+            alias = _state.replica = random.choice(healthy)
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
+
+
+class ReplicaMiddleware:
+    """Включает чтение с реплик для безопасных запросов.
+
+    После изменяющего запроса клиент на REPLICA_PIN_SECONDS читает
+    только с основной БД, чтобы сразу видеть свои изменения. Если
+    реплика отказала посреди запроса, запрос повторяется на основной БД.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not replica_aliases():
+            return self.get_response(request)
+        key = pin_key(request)
+        safe = request.method in SAFE_METHODS
+        _state.use_replica = safe and not (key and cache.get(key))
+        _state.replica = None
+        try:
+            response = self.get_response(request)
+        finally:
+            if safe:
+                metrics.incr(
+                    'db.reads.replica' if _state.replica
+                    else 'db.reads.primary'
+                )
+            _state.use_replica = False
+            _state.replica = None
+        if not safe and key:
+            cache.set(key, True, settings.REPLICA_PIN_SECONDS)
+        return response
+
+    def process_exception(self, request, exception):
+        alias = getattr(_state, 'replica', None)
+        if alias is None or not isinstance(
+                exception, (OperationalError, InterfaceError)):
+            return None
+        logger.warning('Реплика %s отказала, запрос повторяется на основной '
+                       'БД', alias, exc_info=exception)
+        mark_unhealthy(alias)
+        metrics.incr('db.replica.failures')
+        _state.use_replica = False
+        _state.replica = None
+        return self.get_response(request)
@@ -0,0 +1,50 @@
+import threading
+import time
+from collections import Counter
+
+from django.core.cache import cache
+
+KEY = 'metrics:{}'
+NAMES_KEY = 'metrics:names'
+FLUSH_INTERVAL = 10
+
+_counters = Counter()
+_lock = threading.Lock()
+_flushed = time.monotonic()
+
+
+def incr(name, value=1):
+    """Увеличивает счётчик. В общий кэш счётчики сбрасываются пачкой."""
+    with _lock:
+        _counters[name] += value
+    if time.monotonic() - _flushed > FLUSH_INTERVAL:
+        flush()
+
+
+def flush():
+    """Переносит накопленные в воркере счётчики в общий кэш."""
+    global _flushed
+    with _lock:
+        counters = dict(_counters)
+        _counters.clear()
+        _flushed = time.monotonic()
+    if not counters:
+        return
+    names = cache.get(NAMES_KEY, set())
+    if not names.issuperset(counters):
+        cache.set(NAMES_KEY, names | counters.keys(), None)
+    for name, value in counters.items():
+        key = KEY.format(name)
+        cache.add(key, 0, None)
+        try:
+            cache.incr(key, value)
+        except ValueError:
+            cache.set(key, value, None)
+
+
+def snapshot():
+    """Значения всех счётчиков всех воркеров."""
+    flush()
+    names = sorted(cache.get(NAMES_KEY, set()))
+    values = cache.get_many([KEY.format(name) for name in names])
+    return {name: values.get(KEY.format(name), 0) for name in names}
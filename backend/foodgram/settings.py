@@ -43,6 +43,7 @@ MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
+    'foodgram.db_router.ReplicaMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
@@ -84,6 +85,50 @@ DATABASES = {
     }
 }
 
+# Реплики для чтения: DB_REPLICA_HOSTS=replica1,replica2. Для локальной
+# проверки можно указать тот же хост, что и DB_HOST. Короткий таймаут
+# подключения не даёт недоступной реплике держать запросы: чтение
+# уходит на основную БД.
+for index, host in enumerate(
+        filter(None, os.getenv('DB_REPLICA_HOSTS', '').split(','))):
+    DATABASES[f'replica_{index}'] = {
+        **DATABASES['default'],
+        'HOST': host.strip(),
+        'OPTIONS': {
+            'connect_timeout': int(os.getenv('DB_REPLICA_CONNECT_TIMEOUT', 2)),
+        },
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['foodgram.db_router.ReplicaRouter']
+
+# Сколько секунд после записи клиент читает только с основной БД.
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', 5))
+# Допустимое отставание реплики в секундах и частота его проверки.
+REPLICA_MAX_LAG = float(os.getenv('REPLICA_MAX_LAG', 2))
+REPLICA_CHECK_INTERVAL = 5
+
+# Cache
+# В кэше живут версии рецептов и справочников, ведра троттлинга и
+# привязки к основной БД после записи: их потеря сбрасывает кэши и
+# лимиты. В docker compose кэш — общий memcached. Файловый кэш по
+# умолчанию — только для разработки: он перебирает все файлы при каждой
+# записи и вытесняет случайные записи сверх CACHE_MAX_ENTRIES.
+
+CACHE_BACKEND = os.getenv(
+    'CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'
+)
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': os.getenv('CACHE_LOCATION', '/tmp/foodgram_cache'),
+    }
+}
+if CACHE_BACKEND.endswith('.FileBasedCache'):
+    CACHES['default']['OPTIONS'] = {
+        'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', 50000)),
+    }
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -114,6 +159,18 @@ REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.'
                                 'PageNumberPagination',
     "PAGE_SIZE": 6,
+    # Дорогие действия списывают токены из вёдер пользователя и адреса,
+    # стоимость задаётся в throttle_costs вьюсета.
+    'DEFAULT_THROTTLE_CLASSES': [
+        'api.throttling.UserBucketThrottle',
+        'api.throttling.IPBucketThrottle',
+    ],
+    'DEFAULT_THROTTLE_RATES': {
+        'user': os.getenv('THROTTLE_USER_RATE', '60/min'),
+        'ip': os.getenv('THROTTLE_IP_RATE', '180/min'),
+    },
+    # Адрес клиента берётся из X-Forwarded-For, который ставит nginx.
+    'NUM_PROXIES': 1,
 }
 
 DJOSER = {
@@ -152,7 +209,80 @@ STATIC_ROOT = BASE_DIR / 'collected_static'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = '/app/media'
 
+# Заранее сжатые снимки справочников, которые nginx отдаёт напрямую.
+SNAPSHOT_ROOT = os.path.join(MEDIA_ROOT, 'snapshots')
+
+# Двоичный снимок тэгов и ингредиентов, который воркеры отображают
+# в память и читают без копирования. Собирается командой build_catalog
+# и после изменения справочников.
+CATALOG_PATH = os.getenv('CATALOG_PATH', '/tmp/foodgram_catalog.bin')
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Subscription feed
+# Рецепт раскладывается по лентам подписчиков после коммита, пока их не
+# больше FEED_SYNC_FANOUT_LIMIT, иначе ждёт в очереди команды process_feed.
+
+FEED_SYNC_FANOUT_LIMIT = int(os.getenv('FEED_SYNC_FANOUT_LIMIT', 200))
+FEED_BATCH_SIZE = 1000
+FEED_BACKFILL_SIZE = 50
+
+# Popular recipes
+# Вклад добавления в избранное или корзину убывает вдвое за период
+# полураспада. Пересчёт берёт события старше POPULAR_SETTLE_SECONDS:
+# время события ставится до коммита, и более свежие строки могут быть
+# ещё не видны. Значение должно быть больше самой долгой транзакции.
+
+POPULAR_HALF_LIFE_HOURS = 72
+POPULAR_SETTLE_SECONDS = 60
+POPULAR_FAVORITE_WEIGHT = 1.0
+POPULAR_CART_WEIGHT = 0.5
+
+# Pantry search
+# Индекс ингредиент -> рецепты собирает команда build_pantry в файл
+# PANTRY_PATH, общий для воркеров контейнера. После изменения рецептов
+# воркер проверяет, не пересобран ли файл, не чаще раза
+# в PANTRY_INDEX_REFRESH секунд.
+
+PANTRY_PATH = os.getenv('PANTRY_PATH', '/tmp/foodgram_pantry.npz')
+PANTRY_INDEX_REFRESH = 30
+
+# User deletion
+# Пользователь с историей удаляется пачками строк в коротких транзакциях
+# с паузой между ними, чтобы не мешать другим запросам на запись.
+
+DELETION_BATCH_SIZE = 1000
+DELETION_RECIPE_BATCH_SIZE = 100
+DELETION_PAUSE = 0.01
+
+# Recipe representations
+# Общая для всех пользователей часть рецепта хранится в памяти воркера,
+# давние записи вытесняются после RECIPE_CACHE_SIZE рецептов.
+
+RECIPE_CACHE_SIZE = int(os.getenv('RECIPE_CACHE_SIZE', 5000))
+
+# Cached responses
+# Справочники и суммы корзины хранятся в общем кэше. Устаревшее значение
+# пересчитывает один воркер, остальные пока отдают старое. Блокировка
+# пересчёта снимается через CACHE_LOCK_TIMEOUT секунд.
+
+CATALOG_CACHE_TIMEOUT = int(os.getenv('CATALOG_CACHE_TIMEOUT', 3600))
+CART_CACHE_TIMEOUT = int(os.getenv('CART_CACHE_TIMEOUT', 600))
+CACHE_LOCK_TIMEOUT = 10
+
+# Recipe batch
+# /api/recipes/batch/?ids=1,2,3 отдаёт не больше RECIPE_BATCH_LIMIT
+# рецептов за запрос.
+
+RECIPE_BATCH_LIMIT = int(os.getenv('RECIPE_BATCH_LIMIT', 100))
+
+# Gateway cache
+# После изменения данных Django просит nginx обновить закэшированные
+# анонимные ответы. Без GATEWAY_URL обновление выключено.
+
+GATEWAY_URL = os.getenv('GATEWAY_URL', '')
+CACHE_PURGE_TOKEN = os.getenv('CACHE_PURGE_TOKEN', '')
+CACHE_PURGE_HOST = os.getenv('CACHE_PURGE_HOST', ALLOWED_HOSTS[0])
@@ -0,0 +1,63 @@
+import inspect
+import time
+
+from django.db import connections
+from django.urls import get_resolver, resolve
+from PIL import Image
+from rest_framework.serializers import BaseSerializer, ListSerializer
+
+from api import serializers
+from recipes.catalog import get_catalog
+
+WARMUP_URLS = ('/api/recipes/', '/api/recipes/1/', '/api/users/me/')
+
+
+def timed(steps, name, func):
+    start = time.perf_counter()
+    func()
+    steps[name] = round(time.perf_counter() - start, 4)
+
+
+def compile_urls():
+    get_resolver().reverse_dict
+    for url in WARMUP_URLS:
+        resolve(url)
+
+
+def build_serializers():
+    """Строит поля всех сериализаторов API, подтягивая ленивые импорты."""
+    for serializer in vars(serializers).values():
+        if (inspect.isclass(serializer)
+                and issubclass(serializer, BaseSerializer)
+                and not issubclass(serializer, ListSerializer)
+                and serializer.__module__ == serializers.__name__):
+            serializer().fields
+
+
+def prime_lookups():
+    # Каталог тэгов и ингредиентов: файл отображается в память, БД
+    # читается, только если каталог ещё не собран.
+    get_catalog()
+
+
+def prepare():
+    """Прогрев без БД в мастере gunicorn до форка воркеров.
+
+    Всё, что построено здесь, воркеры получают готовым после форка.
+    Возвращает длительность шагов в секундах.
+    """
+    steps = {}
+    timed(steps, 'urls', compile_urls)
+    timed(steps, 'serializers', build_serializers)
+    timed(steps, 'pillow', Image.init)
+    # Соединения мастера нельзя делить с воркерами.
+    connections.close_all()
+    return steps
+
+
+def prime():
+    """Прогрев воркера до приёма запросов: соединение с БД и справочники."""
+    steps = {}
+    timed(steps, 'database', connections['default'].ensure_connection)
+    timed(steps, 'lookups', prime_lookups)
+    return steps
@@ -0,0 +1,33 @@
+import os
+
+bind = '0.0.0.0:8888'
+# По умолчанию один воркер, как у gunicorn без конфигурации.
+workers = int(os.getenv('GUNICORN_WORKERS', 1))
+# Django, DRF и зависимости импортируются один раз в мастере, воркеры
+# получают их готовыми после форка.
+preload_app = True
+
+
+def when_ready(server):
+    from foodgram import warmup
+
+    try:
+        server.log.info('Warm-up in master: %s', warmup.prepare())
+    except Exception:
+        server.log.exception('Warm-up in master failed')
+
+
+def post_worker_init(worker):
+    # Ошибка здесь случается до загрузки воркера, и gunicorn останавливает
+    # весь сервер. Без прогрева воркер всё подготовит при первых запросах.
+    from django.db import connections
+
+    from foodgram import warmup
+
+    try:
+        worker.log.info(
+            'Warm-up in worker %s: %s', worker.pid, warmup.prime()
+        )
+    except Exception:
+        worker.log.exception('Warm-up in worker %s failed', worker.pid)
+        connections.close_all()
@@ -1,35 +1,55 @@
 from django.contrib import admin
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 
 from .models import (Favorite, Follow, Ingredient, IngredientsInRecipe, Recipe,
                      ShoppingCart, Tag)
+from .paginators import EstimatedCountPaginator
 
 
 class IngredientAdmin(admin.ModelAdmin):
     """Админка ингредиентов."""
     list_display = ('pk', 'name', 'measurement_unit')
     list_editable = ('name', 'measurement_unit')
-    list_filter = ('name', )
-    search_fields = ('name', )
+    list_filter = ('measurement_unit', )
+    search_fields = ('^name', )
 
 
 class IngredientsInRecipeInline(admin.TabularInline):
     """Админка отображения ингредиентов при создании рецепта."""
     model = IngredientsInRecipe
+    autocomplete_fields = ('ingredient', )
 
 
 class RecipeAdmin(admin.ModelAdmin):
     """Админка рецептов."""
     list_display = ('pk', 'name', 'author',
                     'in_favorites_amount')
-    list_editable = ('name', 'author')
+    list_editable = ('name', )
+    list_select_related = ('author', )
     readonly_fields = ('in_favorites_amount',)
-    list_filter = ('name', 'author', 'tags')
-    search_fields = ('name', )
+    list_filter = ('tags', )
+    search_fields = ('^name', )
+    autocomplete_fields = ('author', )
     empty_value_display = '-пусто-'
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     inlines = [
         IngredientsInRecipeInline,
     ]
 
+    def get_queryset(self, request):
+        # Подзапрос считается только для строк страницы, а не GROUP BY
+        # по всей таблице рецептов.
+        favorites = Favorite.objects.filter(
+            recipe=OuterRef('pk')
+        ).order_by().values('recipe').annotate(amount=Count('pk'))
+        return super().get_queryset(request).annotate(
+            favorites_amount=Coalesce(
+                Subquery(favorites.values('amount')), 0
+            )
+        )
+
     def tags(self, row):
         return ','.join([x.name for x in row.tags.all()])
 
@@ -37,8 +57,9 @@ class RecipeAdmin(admin.ModelAdmin):
         return ','.join([x.name for x in row.ingredients.all()])
 
     def in_favorites_amount(self, obj):
-        return obj.recipe_favorite.count()
+        return obj.favorites_amount
     in_favorites_amount.short_description = 'Кол-во добавлений в избранное'
+    in_favorites_amount.admin_order_field = 'favorites_amount'
 
 
 class TagAdmin(admin.ModelAdmin):
@@ -51,29 +72,42 @@ class TagAdmin(admin.ModelAdmin):
 class IngredientsInRecipeAdmin(admin.ModelAdmin):
     """Админка ингредиентов в рецептах."""
     list_display = ('pk', 'ingredient', 'recipe', 'amount')
-    list_editable = ('ingredient', 'recipe', 'amount')
+    list_editable = ('amount', )
+    list_select_related = ('ingredient', 'recipe')
+    autocomplete_fields = ('ingredient', 'recipe')
     empty_value_display = '-пусто-'
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 class ShoppingCartAdmin(admin.ModelAdmin):
     """Админка корзины."""
     list_display = ('pk', 'user', 'recipe')
-    list_editable = ('user', 'recipe')
+    list_select_related = ('user', 'recipe')
+    autocomplete_fields = ('user', 'recipe')
     empty_value_display = '-пусто-'
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 class FavoriteAdmin(admin.ModelAdmin):
     """Админка избранного."""
     list_display = ('pk', 'user', 'recipe')
-    list_editable = ('user', 'recipe')
+    list_select_related = ('user', 'recipe')
+    autocomplete_fields = ('user', 'recipe')
     empty_value_display = '-пусто-'
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 class FollowAdmin(admin.ModelAdmin):
     """Админка подписок."""
     list_display = ('pk', 'user', 'following')
-    list_editable = ('user', 'following')
+    list_select_related = ('user', 'following')
+    autocomplete_fields = ('user', 'following')
     empty_value_display = '-пусто-'
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 admin.site.register(Ingredient, IngredientAdmin)
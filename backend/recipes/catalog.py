@@ -0,0 +1,221 @@
+import mmap
+import os
+import struct
+from array import array
+from collections import OrderedDict
+from collections.abc import Mapping
+from uuid import uuid4
+
+from django.conf import settings
+
+from .models import Ingredient, Tag
+from .versions import get_version, set_version
+
+VERSION = 'catalog'
+MAGIC = b'FGC1'
+# Заголовок: метка формата, версия каталога и смещения двух таблиц.
+HEADER = struct.Struct('<4s32sII')
+TABLE_HEADER = struct.Struct('<II')
+TAG_FIELDS = ('name', 'color', 'slug')
+INGREDIENT_FIELDS = ('name', 'measurement_unit')
+
+
+def pack_table(rows, fields, key):
+    """Упаковывает строки таблицы в непрерывный блок байт.
+
+    Строки лежат в порядке выборки из БД, к ним добавлены перестановки,
+    отсортированные по ключу поиска и по id. Текстовые поля — UTF-8
+    в общем блоке, их границы — в массиве смещений.
+    """
+    offsets, blob = array('I', [0]), bytearray()
+    for row in rows:
+        for field in fields:
+            blob += row[field].encode()
+            offsets.append(len(blob))
+    blob += bytes(-len(blob) % 4)
+    by_key = sorted(range(len(rows)), key=lambda index: key(rows[index]))
+    by_id = sorted(range(len(rows)), key=lambda index: rows[index]['id'])
+    return b''.join((
+        TABLE_HEADER.pack(len(rows), len(fields)),
+        array('I', [row['id'] for row in rows]).tobytes(),
+        array('I', by_key).tobytes(),
+        array('I', by_id).tobytes(),
+        offsets.tobytes(),
+        bytes(blob),
+    ))
+
+
+def build(version=None):
+    """Пишет двоичный снимок тэгов и ингредиентов для всех воркеров.
+
+    Файл заменяется атомарным переименованием, уже открытые воркерами
+    отображения продолжают читать старый файл. Без version каталог
+    получает новую версию, и воркеры открывают новый файл.
+    """
+    tags = pack_table(
+        list(Tag.objects.values('id', *TAG_FIELDS)), TAG_FIELDS,
+        key=lambda row: row['slug'],
+    )
+    ingredients = pack_table(
+        list(Ingredient.objects.values('id', *INGREDIENT_FIELDS)),
+        INGREDIENT_FIELDS, key=lambda row: row['name'].lower(),
+    )
+    version = version or uuid4().hex
+    path = settings.CATALOG_PATH
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'wb') as output:
+        output.write(HEADER.pack(
+            MAGIC, version.encode(), HEADER.size, HEADER.size + len(tags)
+        ))
+        output.write(tags)
+        output.write(ingredients)
+    os.replace(tmp, path)
+    set_version(VERSION, version)
+    return version
+
+
+class Table:
+    """Таблица каталога поверх отображённого в память файла.
+
+    Массивы и тексты не копируются в память воркера, строки
+    декодируются только при обращении.
+    """
+
+    def __init__(self, buffer, offset, fields, key_field, fold=False):
+        rows, width = TABLE_HEADER.unpack_from(buffer, offset)
+        self.fields, self.width, self.rows = fields, width, rows
+        self.key_field, self.fold = fields.index(key_field), fold
+        position = offset + TABLE_HEADER.size
+        arrays = []
+        for count in (rows, rows, rows, rows * width + 1):
+            end = position + count * 4
+            arrays.append(buffer[position:end].cast('I'))
+            position = end
+        self.ids, self.by_key, self.by_id, self.offsets = arrays
+        self.blob = buffer[position:position + self.offsets[-1]]
+
+    def __len__(self):
+        return self.rows
+
+    def value(self, index, field):
+        cell = index * self.width + field
+        return str(
+            self.blob[self.offsets[cell]:self.offsets[cell + 1]], 'utf-8'
+        )
+
+    def key(self, index):
+        key = self.value(index, self.key_field)
+        return key.lower() if self.fold else key
+
+    def row(self, index):
+        row = OrderedDict(id=self.ids[index])
+        for field, name in enumerate(self.fields):
+            row[name] = self.value(index, field)
+        return row
+
+    def all(self):
+        return [self.row(index) for index in range(self.rows)]
+
+    def lower_bound(self, key):
+        low, high = 0, self.rows
+        while low < high:
+            middle = (low + high) // 2
+            if self.key(self.by_key[middle]) < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def find(self, key):
+        """Номер строки с ключом key или None."""
+        position = self.lower_bound(key)
+        if position < self.rows and self.key(self.by_key[position]) == key:
+            return self.by_key[position]
+        return None
+
+    def search(self, prefix):
+        """Строки, ключ которых начинается с prefix, в исходном порядке."""
+        prefix = prefix.lower() if self.fold else prefix
+        found = []
+        for position in range(self.lower_bound(prefix), self.rows):
+            index = self.by_key[position]
+            if not self.key(index).startswith(prefix):
+                break
+            found.append(index)
+        return [self.row(index) for index in sorted(found)]
+
+    def get(self, pk):
+        """Строка с данным id или None."""
+        low, high = 0, self.rows
+        while low < high:
+            middle = (low + high) // 2
+            index = self.by_id[middle]
+            if self.ids[index] < pk:
+                low = middle + 1
+            elif self.ids[index] > pk:
+                high = middle
+            else:
+                return self.row(index)
+        return None
+
+
+class KeyMap(Mapping):
+    """Словарь ключ -> id поверх таблицы без копирования данных."""
+
+    def __init__(self, table):
+        self.table = table
+
+    def __getitem__(self, key):
+        index = self.table.find(key)
+        if index is None:
+            raise KeyError(key)
+        return self.table.ids[index]
+
+    def __iter__(self):
+        for index in self.table.by_key:
+            yield self.table.key(index)
+
+    def __len__(self):
+        return len(self.table)
+
+
+class Catalog:
+    """Открытый только на чтение снимок тэгов и ингредиентов."""
+
+    def __init__(self, path):
+        with open(path, 'rb') as source:
+            self.map = mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ)
+        buffer = memoryview(self.map)
+        magic, version, tags, ingredients = HEADER.unpack_from(buffer)
+        if magic != MAGIC:
+            raise ValueError(f'{path} не является каталогом')
+        self.version = version.decode()
+        self.tags = Table(buffer, tags, TAG_FIELDS, 'slug')
+        self.ingredients = Table(
+            buffer, ingredients, INGREDIENT_FIELDS, 'name', fold=True
+        )
+
+
+_catalog = None
+
+
+def open_catalog(version):
+    try:
+        catalog = Catalog(settings.CATALOG_PATH)
+    except (OSError, ValueError):
+        catalog = None
+    if catalog is None or catalog.version != version:
+        # Файла нет или он собран до изменений, например в другом
+        # контейнере: собираем свой с текущей версией.
+        build(version)
+        catalog = Catalog(settings.CATALOG_PATH)
+    return catalog
+
+
+def get_catalog():
+    """Каталог текущей версии, открытый в этом воркере."""
+    global _catalog
+    version = get_version(VERSION)
+    if _catalog is None or _catalog.version != version:
+        _catalog = open_catalog(version)
+    return _catalog
@@ -0,0 +1,77 @@
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import FeedEntry, Follow, PendingFanOut, Recipe
+
+
+def fan_out(recipe_id, author_id, pub_date):
+    """Раскладывает рецепт по лентам всех подписчиков автора."""
+    followers = Follow.objects.filter(
+        following_id=author_id
+    ).values_list('user_id', flat=True).order_by().iterator(
+        chunk_size=settings.FEED_BATCH_SIZE
+    )
+    entries = []
+    for user_id in followers:
+        entries.append(FeedEntry(
+            user_id=user_id, author_id=author_id,
+            recipe_id=recipe_id, pub_date=pub_date,
+        ))
+        if len(entries) >= settings.FEED_BATCH_SIZE:
+            FeedEntry.objects.bulk_create(entries, ignore_conflicts=True)
+            entries = []
+    FeedEntry.objects.bulk_create(entries, ignore_conflicts=True)
+
+
+def enqueue_fan_out(recipe):
+    """Ставит новый рецепт в очередь раскладки по лентам.
+
+    Запись в очереди создаётся в транзакции рецепта и не теряется при
+    перезапуске воркера. После коммита рецепт с небольшим числом
+    подписчиков раскладывается сразу, остальные разбирает команда
+    process_feed.
+    """
+    PendingFanOut.objects.create(recipe=recipe)
+    transaction.on_commit(partial(fan_out_if_small, recipe))
+
+
+def fan_out_if_small(recipe):
+    followers = Follow.objects.filter(following_id=recipe.author_id).count()
+    if followers > settings.FEED_SYNC_FANOUT_LIMIT:
+        return
+    fan_out(recipe.pk, recipe.author_id, recipe.pub_date)
+    PendingFanOut.objects.filter(recipe_id=recipe.pk).delete()
+
+
+def process_pending(limit=None):
+    """Раскладывает рецепты из очереди, начиная с давних.
+
+    Раскладка идемпотентна, поэтому прерванный запуск можно повторить.
+    """
+    pending = PendingFanOut.objects.select_related('recipe')[:limit]
+    processed = 0
+    for item in pending:
+        recipe = item.recipe
+        fan_out(recipe.pk, recipe.author_id, recipe.pub_date)
+        PendingFanOut.objects.filter(recipe_id=recipe.pk).delete()
+        processed += 1
+    return processed
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту последние рецепты нового автора из подписок."""
+    recipes = Recipe.objects.filter(author_id=author_id).order_by(
+        '-pub_date').values_list('id', 'pub_date')[
+        :settings.FEED_BACKFILL_SIZE]
+    FeedEntry.objects.bulk_create([
+        FeedEntry(user_id=user_id, author_id=author_id,
+                  recipe_id=recipe_id, pub_date=pub_date)
+        for recipe_id, pub_date in recipes
+    ], ignore_conflicts=True)
+
+
+def prune(user_id, author_id):
+    """Убирает из ленты рецепты автора после отписки."""
+    FeedEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
@@ -0,0 +1,9 @@
+from .catalog import KeyMap, get_catalog
+
+TAGS_VERSION = 'tags'
+INGREDIENTS_VERSION = 'ingredients'
+
+
+def get_tag_map():
+    """Словарь slug -> id тэгов поверх общего для воркеров каталога."""
+    return KeyMap(get_catalog().tags)
@@ -0,0 +1,14 @@
+from django.conf import settings
+from django.core.management import BaseCommand
+
+from recipes import catalog
+
+
+class Command(BaseCommand):
+    help = 'Сборка двоичного каталога тэгов и ингредиентов для воркеров'
+
+    def handle(self, **options):
+        version = catalog.build()
+        self.stdout.write(self.style.SUCCESS(
+            f'Каталог {settings.CATALOG_PATH} собран, версия {version}'
+        ))
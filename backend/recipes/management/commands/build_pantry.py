@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.core.management import BaseCommand
+
+from recipes import pantry
+
+
+class Command(BaseCommand):
+    help = 'Сборка индекса поиска рецептов по имеющимся ингредиентам'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Собрать индекс, даже если рецепты не менялись'
+        )
+
+    def handle(self, **options):
+        if not options['force'] and not pantry.is_stale():
+            self.stdout.write('Индекс не устарел')
+            return
+        version = pantry.build()
+        self.stdout.write(self.style.SUCCESS(
+            f'Индекс {settings.PANTRY_PATH} собран, версия {version}'
+        ))
@@ -0,0 +1,42 @@
+from django.core.management import BaseCommand
+
+from recipes import similarity
+
+
+class Command(BaseCommand):
+    help = 'Пересчёт похожих рецептов по общим ингредиентам'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--top-k', type=int, default=10,
+            help='Сколько похожих рецептов хранить для каждого рецепта'
+        )
+        parser.add_argument(
+            '--metric', choices=('jaccard', 'cosine'), default='jaccard',
+            help='Мера сходства наборов ингредиентов'
+        )
+        parser.add_argument(
+            '--max-df', type=float, default=0.1,
+            help='Не искать кандидатов по ингредиентам, которые есть '
+                 'больше чем в этой доле рецептов'
+        )
+        parser.add_argument(
+            '--min-score', type=float, default=0.05,
+            help='Минимальное сходство для сохранения'
+        )
+        parser.add_argument(
+            '--block-size', type=int, default=2000,
+            help='Сколько строк матрицы обрабатывать за одно умножение'
+        )
+
+    def handle(self, **options):
+        total = similarity.build(
+            top_k=options['top_k'],
+            metric=options['metric'],
+            max_df=options['max_df'],
+            min_score=options['min_score'],
+            block_size=options['block_size'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Похожие рецепты пересчитаны для {total} рецептов'
+        ))
@@ -0,0 +1,13 @@
+from django.core.management import BaseCommand
+
+from recipes import snapshots
+
+
+class Command(BaseCommand):
+    help = 'Сборка статических снимков справочников для nginx'
+
+    def handle(self, **options):
+        version = snapshots.build_ingredients()
+        self.stdout.write(self.style.SUCCESS(
+            f'Снимок ингредиентов собран, версия {version}'
+        ))
@@ -0,0 +1,84 @@
+import json
+import sys
+from collections import defaultdict
+
+from django.core.management import BaseCommand
+
+from recipes.models import IngredientsInRecipe, Recipe
+
+CHUNK_SIZE = 2000
+
+
+class Command(BaseCommand):
+    help = 'Потоковая выгрузка рецептов в NDJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '-o', '--output', default='-',
+            help='Файл для выгрузки, по умолчанию stdout'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=CHUNK_SIZE,
+            help='Размер пачки, читаемой из серверного курсора'
+        )
+
+    def handle(self, **options):
+        chunk_size = options['chunk_size']
+        output = options['output']
+        stream = (sys.stdout if output == '-'
+                  else open(output, 'w', encoding='utf-8'))
+        recipes = Recipe.objects.select_related('author').order_by(
+            'pk').iterator(chunk_size=chunk_size)
+        exported = 0
+        chunk = []
+        try:
+            for recipe in recipes:
+                chunk.append(recipe)
+                if len(chunk) >= chunk_size:
+                    exported += self.write_chunk(stream, chunk)
+                    chunk = []
+            if chunk:
+                exported += self.write_chunk(stream, chunk)
+        finally:
+            if stream is not sys.stdout:
+                stream.close()
+        self.stderr.write(self.style.SUCCESS(
+            f'Выгружено рецептов: {exported}'
+        ))
+
+    def write_chunk(self, stream, chunk):
+        """Дописывает пачку рецептов вместе с тэгами и ингредиентами."""
+        ids = [recipe.pk for recipe in chunk]
+        tags = defaultdict(list)
+        for recipe_id, slug in Recipe.tags.through.objects.filter(
+                recipe_id__in=ids).values_list('recipe_id', 'tag__slug'):
+            tags[recipe_id].append(slug)
+        ingredients = defaultdict(list)
+        for recipe_id, name, unit, amount in (
+                IngredientsInRecipe.objects.filter(
+                    recipe_id__in=ids).values_list(
+                    'recipe_id', 'ingredient__name',
+                    'ingredient__measurement_unit', 'amount')):
+            ingredients[recipe_id].append({
+                'name': name,
+                'measurement_unit': unit,
+                'amount': amount,
+            })
+        for recipe in chunk:
+            stream.write(json.dumps({
+                'name': recipe.name,
+                'text': recipe.text,
+                'cooking_time': recipe.cooking_time,
+                'image': recipe.image.name,
+                'pub_date': recipe.pub_date.isoformat(),
+                'author': {
+                    'email': recipe.author.email,
+                    'username': recipe.author.username,
+                    'first_name': recipe.author.first_name,
+                    'last_name': recipe.author.last_name,
+                },
+                'tags': tags[recipe.pk],
+                'ingredients': ingredients[recipe.pk],
+            }, ensure_ascii=False) + '\n')
+        self.stderr.write(f'Выгружено ещё {len(chunk)} рецептов')
+        return len(chunk)
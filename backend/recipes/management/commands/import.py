@@ -1,20 +1,132 @@
-from django.core.management import BaseCommand
+import csv
+import json
+import os
+from itertools import islice
 
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes import catalog, snapshots
+from recipes.lookups import INGREDIENTS_VERSION
 from recipes.models import Ingredient
+from recipes.versions import bump_version
+
+BATCH_SIZE = 500
+READ_SIZE = 64 * 1024
+
+
+def read_csv(source):
+    for row in csv.reader(source):
+        if len(row) >= 2:
+            yield row[0], row[1]
+
+
+def read_json(source):
+    """Потоково читает JSON-массив или NDJSON с объектами ингредиентов."""
+    decoder = json.JSONDecoder()
+    buffer = source.read(READ_SIZE).lstrip()
+    if buffer.startswith('['):
+        buffer = buffer[1:]
+    while True:
+        buffer = buffer.lstrip().lstrip(',').lstrip()
+        if buffer.startswith(']'):
+            return
+        try:
+            item, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            chunk = source.read(READ_SIZE)
+            if not chunk:
+                if buffer:
+                    raise
+                return
+            buffer += chunk
+            continue
+        buffer = buffer[end:]
+        yield item.get('name', ''), item.get('measurement_unit', '')
+
+
+READERS = {
+    '.csv': read_csv,
+    '.json': read_json,
+    '.ndjson': read_json,
+}
 
 
 class Command(BaseCommand):
-    help = 'Импорт данных из csv файлов в БД'
+    help = 'Импорт ингредиентов из csv или json файлов в БД'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default='ingredients.csv',
+            help='Файл с ингредиентами: .csv, .json или .ndjson'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=BATCH_SIZE,
+            help='Количество ингредиентов в одной транзакции'
+        )
 
     def handle(self, **options):
-        with open("ingredients.csv") as ingredients:
-            ingredients_list = []
-            for ingredient in ingredients:
-                ingred = ingredient.split(',')
-                ingredients_list.append(Ingredient(
-                    name=ingred[0],
-                    measurement_unit=ingred[1]
+        path = options['path']
+        reader = READERS.get(os.path.splitext(path)[1].lower())
+        if reader is None:
+            raise CommandError('Поддерживаются только файлы csv и json')
+        if not os.path.exists(path):
+            raise CommandError(f'Файл {path} не найден')
+
+        self.inserted = self.updated = self.skipped = 0
+        with open(path, encoding='utf-8', newline='') as source:
+            rows = reader(source)
+            while True:
+                batch = list(islice(rows, options['batch_size']))
+                if not batch:
+                    break
+                self.upsert(batch)
+
+        snapshots.build_ingredients()
+        catalog.build()
+        # Пачки пишутся без сигналов, кэши справочника сбрасываются здесь.
+        bump_version(INGREDIENTS_VERSION)
+        self.stdout.write(self.style.SUCCESS(
+            f'Данные успешно загружены. Добавлено: {self.inserted}, '
+            f'обновлено: {self.updated}, пропущено: {self.skipped}'
+        ))
+
+    def upsert(self, batch):
+        """Вставляет новые ингредиенты и чинит старые записи пачки.
+
+        Старые записи — это строки, загруженные прежней версией импорта
+        с пробелами и переводом строки в единице измерения.
+        """
+        rows = {}
+        for name, unit in batch:
+            key = (name.strip(), unit.strip())
+            if not all(key) or key in rows:
+                self.skipped += 1
+                continue
+            rows[key] = None
+
+        exact, legacy = set(), {}
+        for pk, name, unit in Ingredient.objects.filter(
+                name__in={name for name, _ in rows}).values_list(
+                'id', 'name', 'measurement_unit'):
+            exact.add((name, unit))
+            legacy.setdefault((name, unit.strip()), pk)
+
+        to_create, to_update = [], []
+        for name, unit in rows:
+            if (name, unit) in exact:
+                self.skipped += 1
+            elif (name, unit) in legacy:
+                to_update.append(Ingredient(
+                    id=legacy[name, unit], name=name, measurement_unit=unit
                 ))
-            Ingredient.objects.bulk_create(ingredients_list)
+            else:
+                to_create.append(
+                    Ingredient(name=name, measurement_unit=unit)
+                )
 
-        self.stdout.write(self.style.SUCCESS('Данные успешно загружены'))
+        with transaction.atomic():
+            Ingredient.objects.bulk_update(to_update, ['measurement_unit'])
+            Ingredient.objects.bulk_create(to_create, ignore_conflicts=True)
+        self.updated += len(to_update)
+        self.inserted += len(to_create)
@@ -0,0 +1,409 @@
+import json
+import logging
+import os
+import random
+import subprocess
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+
+import numpy as np
+import requests
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+from django.core.servers.basehttp import (ThreadedWSGIServer,
+                                          WSGIRequestHandler,
+                                          get_internal_wsgi_application)
+from rest_framework.authtoken.models import Token
+
+from recipes import catalog, pantry, snapshots
+from recipes.lookups import INGREDIENTS_VERSION
+from recipes.models import Ingredient, IngredientsInRecipe, Recipe, Tag
+from recipes.versions import bump_version
+from users.models import User
+
+PREFIX = 'loadtest-'
+SEED_TAGS = (
+    ('Нагрузка: завтрак', '#E26C2D', 'loadtest-breakfast'),
+    ('Нагрузка: обед', '#49B64E', 'loadtest-lunch'),
+    ('Нагрузка: ужин', '#8775D2', 'loadtest-dinner'),
+)
+SEED_INGREDIENTS = 200
+PERCENTILES = (50, 95, 99)
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class VirtualUser:
+    """Клиент со своим токеном и адресом, проходящий сценарии по кругу."""
+
+    def __init__(self, number, base_url, host, token, data):
+        self.base_url = base_url
+        self.data = data
+        self.samples = defaultdict(list)
+        self.session = requests.Session()
+        self.session.headers.update({
+            'Authorization': f'Token {token.key}',
+            'Host': host,
+            # Для встроенного сервера каждый клиент приходит со своего
+            # адреса, за nginx адрес всё равно подставит шлюз.
+            'X-Forwarded-For': f'10.{number // 65536 % 256}.'
+                               f'{number // 256 % 256}.{number % 256}',
+        })
+        self.user_id = token.user_id
+
+    def request(self, name, method, path, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = self.session.request(
+                method, self.base_url + path, timeout=30, **kwargs
+            )
+            status = response.status_code
+        except requests.RequestException:
+            response, status = None, 0
+        self.samples[name].append((time.perf_counter() - start, status))
+        if response is not None and status == 200 and response.headers.get(
+                'Content-Type', '').startswith('application/json'):
+            return response.json()
+        return None
+
+    def journey(self):
+        data = self.data
+        recipe_id = random.choice(data['recipes'])
+        author_id = random.choice(data['authors'])
+        while author_id == self.user_id:
+            author_id = random.choice(data['authors'])
+
+        page = self.request(
+            'recipes.list', 'GET', '/api/recipes/',
+            params={'tags': random.sample(data['tags'], 2),
+                    'page': random.randint(1, 5)}
+        )
+        if page and page.get('results'):
+            recipe_id = random.choice(page['results'])['id']
+        self.request(
+            'recipes.detail', 'GET', f'/api/recipes/{recipe_id}/'
+        )
+        self.request(
+            'recipes.favorite', 'POST', f'/api/recipes/{recipe_id}/favorite/'
+        )
+        self.request(
+            'recipes.unfavorite', 'DELETE',
+            f'/api/recipes/{recipe_id}/favorite/'
+        )
+        self.request(
+            'recipes.cart_add', 'POST',
+            f'/api/recipes/{recipe_id}/shopping_cart/'
+        )
+        self.request(
+            'recipes.download_cart', 'GET',
+            '/api/recipes/download_shopping_cart/'
+        )
+        self.request(
+            'recipes.cart_remove', 'DELETE',
+            f'/api/recipes/{recipe_id}/shopping_cart/'
+        )
+        self.request(
+            'ingredients.autocomplete', 'GET', '/api/ingredients/',
+            params={'name': random.choice(data['prefixes'])}
+        )
+        self.request(
+            'users.subscribe', 'POST', f'/api/users/{author_id}/subscribe/'
+        )
+        self.request(
+            'users.subscriptions', 'GET', '/api/users/subscriptions/',
+            params={'recipes_limit': 3}
+        )
+        self.request('recipes.feed', 'GET', '/api/recipes/feed/')
+        self.request(
+            'users.unsubscribe', 'DELETE',
+            f'/api/users/{author_id}/subscribe/'
+        )
+
+    def run(self, deadline):
+        while time.monotonic() < deadline:
+            self.journey()
+
+
+def summarize(samples, elapsed):
+    """Пропускная способность и перцентили задержки в миллисекундах."""
+    latencies = np.array([latency for latency, _ in samples]) * 1000
+    statuses = np.array([status for _, status in samples])
+    percentiles = np.percentile(latencies, PERCENTILES)
+    summary = {
+        'requests': len(samples),
+        'rps': round(len(samples) / elapsed, 2),
+        'errors': int(np.count_nonzero(
+            (statuses == 0) | ((statuses >= 400) & (statuses != 429))
+        )),
+        'throttled': int(np.count_nonzero(statuses == 429)),
+    }
+    for percentile, value in zip(PERCENTILES, percentiles):
+        summary[f'p{percentile}'] = round(float(value), 2)
+    summary['max'] = round(float(latencies.max()), 2)
+    return summary
+
+
+def current_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+            text=True, check=True, cwd=settings.BASE_DIR
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочный прогон пользовательских сценариев API '
+            'с перцентилями задержек по эндпоинтам')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--url',
+            help='Адрес запущенного стенда, например http://gateway. '
+                 'Без него поднимается встроенный WSGI-сервер'
+        )
+        parser.add_argument(
+            '--host',
+            help='Заголовок Host, по умолчанию первый из ALLOWED_HOSTS'
+        )
+        parser.add_argument(
+            '--users', type=int, default=10,
+            help='Количество одновременных виртуальных пользователей'
+        )
+        parser.add_argument(
+            '--duration', type=float, default=30,
+            help='Длительность прогона в секундах'
+        )
+        parser.add_argument(
+            '--seed-users', type=int, default=50,
+            help='Сколько синтетических пользователей-авторов создать'
+        )
+        parser.add_argument(
+            '--seed-recipes', type=int, default=20,
+            help='Сколько рецептов создать каждому синтетическому автору'
+        )
+        parser.add_argument(
+            '--output', help='Файл для сохранения результатов в JSON'
+        )
+        parser.add_argument(
+            '--compare', help='JSON прошлого прогона для сравнения'
+        )
+        parser.add_argument(
+            '--cleanup', action='store_true',
+            help='Удалить синтетических пользователей и их рецепты'
+        )
+
+    def handle(self, **options):
+        if options['cleanup']:
+            deleted = sum(queryset.delete()[0] for queryset in (
+                User.objects.filter(username__startswith=PREFIX),
+                Tag.objects.filter(slug__startswith=PREFIX),
+                Ingredient.objects.filter(name__startswith=PREFIX),
+            ))
+            self.stdout.write(f'Удалено объектов: {deleted}')
+            return
+        if options['users'] > options['seed_users']:
+            raise CommandError(
+                'Виртуальных пользователей больше, чем синтетических'
+            )
+        previous = None
+        if options['compare']:
+            if not os.path.exists(options['compare']):
+                raise CommandError(f'Файл {options["compare"]} не найден')
+            with open(options['compare'], encoding='utf-8') as source:
+                previous = json.load(source)
+        data = self.seed(options['seed_users'], options['seed_recipes'])
+        tokens = [
+            Token.objects.get_or_create(user_id=pk)[0]
+            for pk in data['authors'][:options['users']]
+        ]
+        host = options['host'] or next(
+            (host for host in settings.ALLOWED_HOSTS if host != '*'),
+            'localhost'
+        )
+        server = None
+        base_url = options['url']
+        if base_url is None:
+            # Ответы 429 и 4xx ожидаемы и не должны засорять отчёт.
+            logging.getLogger('django.request').setLevel(logging.ERROR)
+            server = ThreadedWSGIServer(('127.0.0.1', 0), QuietHandler)
+            server.set_app(get_internal_wsgi_application())
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            base_url = f'http://127.0.0.1:{server.server_port}'
+        base_url = base_url.rstrip('/')
+
+        clients = [
+            VirtualUser(number, base_url, host, token, data)
+            for number, token in enumerate(tokens, start=1)
+        ]
+        self.stdout.write(
+            f'{len(clients)} пользователей, {options["duration"]} с, '
+            f'{base_url}'
+        )
+        started = datetime.now(timezone.utc)
+        start = time.monotonic()
+        deadline = start + options['duration']
+        threads = [
+            threading.Thread(target=client.run, args=(deadline,))
+            for client in clients
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - start
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+
+        samples = defaultdict(list)
+        for client in clients:
+            for name, values in client.samples.items():
+                samples[name].extend(values)
+        if not samples:
+            raise CommandError('Ни один запрос не выполнен')
+        results = {
+            'commit': current_commit(),
+            'started': started.isoformat(),
+            'target': options['url'] or 'wsgi',
+            'users': len(clients),
+            'duration': round(elapsed, 2),
+            'total': summarize(
+                [sample for values in samples.values() for sample in values],
+                elapsed
+            ),
+            'endpoints': {
+                name: summarize(values, elapsed)
+                for name, values in sorted(samples.items())
+            },
+        }
+        self.report(results)
+        if previous is not None:
+            self.compare(previous, results)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                json.dump(results, output, ensure_ascii=False, indent=2)
+            self.stdout.write(f'Результаты сохранены в {options["output"]}')
+
+    def seed(self, users, recipes_per_user):
+        """Создаёт недостающие синтетические данные и возвращает их id."""
+        for name, color, slug in SEED_TAGS:
+            Tag.objects.get_or_create(
+                slug=slug, defaults={'name': name, 'color': color}
+            )
+        if Ingredient.objects.count() < SEED_INGREDIENTS:
+            Ingredient.objects.bulk_create([
+                Ingredient(name=f'{PREFIX}ингредиент {number}',
+                           measurement_unit='г')
+                for number in range(SEED_INGREDIENTS)
+            ], ignore_conflicts=True)
+            # Пачки пишутся без сигналов, справочник и его кэши
+            # обновляются здесь, как после команды import.
+            snapshots.build_ingredients()
+            catalog.build()
+            bump_version(INGREDIENTS_VERSION)
+        ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+        tag_ids = list(Tag.objects.values_list('id', flat=True))
+
+        existing = set(User.objects.filter(
+            username__startswith=PREFIX).values_list('username', flat=True))
+        new_users = []
+        for number in range(users):
+            username = f'{PREFIX}{number}'
+            if username in existing:
+                continue
+            user = User(
+                username=username, email=f'{username}@example.com',
+                first_name='Нагрузка', last_name=str(number)
+            )
+            user.set_unusable_password()
+            new_users.append(user)
+        User.objects.bulk_create(new_users)
+        if new_users:
+            self.stdout.write(
+                f'Создано синтетических пользователей: {len(new_users)}'
+            )
+            authors = User.objects.filter(
+                username__in=[user.username for user in new_users])
+            recipes = []
+            for author in authors:
+                for number in range(recipes_per_user):
+                    recipe = Recipe(
+                        author=author,
+                        name=f'Рецепт {number} от {author.username}',
+                        text='Синтетический рецепт для нагрузочного прогона.',
+                        cooking_time=random.randint(5, 120),
+                        image='foodgram/image/loadtest.png',
+                    )
+                    recipe.content_hash = recipe.content_digest(
+                        recipe.name, recipe.text, recipe.cooking_time
+                    )
+                    recipes.append(recipe)
+            Recipe.objects.bulk_create(recipes, batch_size=1000)
+            recipes = list(Recipe.objects.filter(
+                author__in=authors).values_list('id', flat=True))
+            Recipe.tags.through.objects.bulk_create([
+                Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_id)
+                for recipe_id in recipes
+                for tag_id in random.sample(tag_ids, min(2, len(tag_ids)))
+            ], batch_size=1000)
+            IngredientsInRecipe.objects.bulk_create([
+                IngredientsInRecipe(
+                    recipe_id=recipe_id, ingredient_id=ingredient_id,
+                    amount=random.randint(1, 500)
+                )
+                for recipe_id in recipes
+                for ingredient_id in random.sample(
+                    ingredient_ids, min(6, len(ingredient_ids)))
+            ], batch_size=1000)
+            # Пачки пишутся без сигналов: индекс поиска по ингредиентам
+            # пересобирается сразу, чтобы прогон видел новые рецепты.
+            bump_version(pantry.VERSION)
+            pantry.build()
+
+        authors = list(User.objects.filter(
+            username__startswith=PREFIX).order_by('pk').values_list(
+            'id', flat=True))
+        return {
+            'authors': authors,
+            'recipes': list(Recipe.objects.filter(
+                author__in=authors).values_list('id', flat=True)),
+            'tags': list(Tag.objects.values_list('slug', flat=True)),
+            'prefixes': sorted({
+                name[:2].lower() for name in Ingredient.objects.values_list(
+                    'name', flat=True)[:SEED_INGREDIENTS]
+            }),
+        }
+
+    def report(self, results):
+        header = (f'{"эндпоинт":<26}{"запросов":>9}{"rps":>9}{"ошибок":>8}'
+                  f'{"429":>6}{"p50":>9}{"p95":>9}{"p99":>9}')
+        self.stdout.write(header)
+        rows = list(results['endpoints'].items())
+        rows.append(('всего', results['total']))
+        for name, stats in rows:
+            self.stdout.write(
+                f'{name:<26}{stats["requests"]:>9}{stats["rps"]:>9}'
+                f'{stats["errors"]:>8}{stats["throttled"]:>6}'
+                f'{stats["p50"]:>9}{stats["p95"]:>9}{stats["p99"]:>9}'
+            )
+
+    def compare(self, previous, results):
+        self.stdout.write(
+            f'Сравнение с {previous.get("commit")} '
+            f'от {previous.get("started")}: p95 и rps'
+        )
+        for name, stats in results['endpoints'].items():
+            old = previous['endpoints'].get(name)
+            if old is None:
+                continue
+            self.stdout.write(
+                f'{name:<26}{old["p95"]:>9} -> {stats["p95"]:<9}'
+                f'{old["rps"]:>9} -> {stats["rps"]}'
+            )
@@ -0,0 +1,19 @@
+from django.core.management import BaseCommand
+
+from recipes import feed
+
+
+class Command(BaseCommand):
+    help = 'Раскладка новых рецептов из очереди по лентам подписчиков'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit', type=int,
+            help='Сколько рецептов разложить за запуск'
+        )
+
+    def handle(self, **options):
+        total = feed.process_pending(options['limit'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Разложено рецептов: {total}'
+        ))
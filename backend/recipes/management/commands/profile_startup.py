@@ -0,0 +1,93 @@
+import json
+import os
+import re
+import subprocess
+import sys
+from collections import Counter
+
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+
+IMPORT_TIME = re.compile(
+    r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$'
+)
+# Холодный старт воркера: импорт приложения, прогрев мастера и воркера.
+STARTUP = '''
+import json, time
+start = time.perf_counter()
+from foodgram.wsgi import application
+loaded = time.perf_counter() - start
+from foodgram import warmup
+print(json.dumps({
+    'application': round(loaded, 4),
+    'prepare': warmup.prepare(),
+    'prime': warmup.prime(),
+}))
+'''
+
+
+class Command(BaseCommand):
+    help = ('Профиль холодного старта: время импорта модулей '
+            'и шагов прогрева воркера')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--top', type=int, default=25,
+            help='Сколько самых долгих модулей и пакетов показать'
+        )
+        parser.add_argument(
+            '--output', help='Файл для сохранения профиля в JSON'
+        )
+
+    def handle(self, **options):
+        environ = dict(
+            os.environ,
+            DJANGO_SETTINGS_MODULE=os.environ.get(
+                'DJANGO_SETTINGS_MODULE', 'foodgram.settings'
+            ),
+        )
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', STARTUP],
+            capture_output=True, text=True, cwd=settings.BASE_DIR,
+            env=environ,
+        )
+        if result.returncode:
+            raise CommandError(result.stderr[-2000:])
+
+        modules, packages = {}, Counter()
+        for line in result.stderr.splitlines():
+            match = IMPORT_TIME.match(line)
+            if match is None:
+                continue
+            own, cumulative, _, name = match.groups()
+            modules[name] = {
+                'self_ms': int(own) / 1000,
+                'cumulative_ms': int(cumulative) / 1000,
+            }
+            packages[name.split('.')[0]] += int(own) / 1000
+        profile = {
+            'imports_ms': round(sum(packages.values()), 1),
+            'warmup': json.loads(result.stdout.strip().splitlines()[-1]),
+            'packages': {
+                name: round(total, 1)
+                for name, total in packages.most_common(options['top'])
+            },
+            'modules': dict(sorted(
+                modules.items(), key=lambda item: -item[1]['cumulative_ms']
+            )[:options['top']]),
+        }
+
+        self.stdout.write(f'Импорт модулей: {profile["imports_ms"]} мс')
+        self.stdout.write(f'Прогрев, с: {profile["warmup"]}')
+        self.stdout.write('Пакеты по собственному времени импорта, мс:')
+        for name, total in profile['packages'].items():
+            self.stdout.write(f'  {name:<40}{total:>10}')
+        self.stdout.write('Модули по полному времени импорта, мс:')
+        for name, times in profile['modules'].items():
+            self.stdout.write(
+                f'  {name:<40}{times["cumulative_ms"]:>10}'
+                f'{times["self_ms"]:>10}'
+            )
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                json.dump(profile, output, ensure_ascii=False, indent=2)
@@ -0,0 +1,19 @@
+from django.core.management import BaseCommand
+
+from recipes import ranking
+
+
+class Command(BaseCommand):
+    help = 'Пересчёт рейтинга популярных рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full', action='store_true',
+            help='Пересчитать рейтинг заново по всем событиям'
+        )
+
+    def handle(self, **options):
+        updated = ranking.rebuild(full=options['full'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Рейтинг обновлён для {updated} рецептов'
+        ))
@@ -0,0 +1,19 @@
+from django.core.management import BaseCommand
+
+from recipes import feed
+from recipes.models import Follow
+
+
+class Command(BaseCommand):
+    help = 'Заполнение лент подписок по существующим подпискам'
+
+    def handle(self, **options):
+        follows = Follow.objects.values_list(
+            'user_id', 'following_id').order_by().iterator()
+        total = 0
+        for user_id, author_id in follows:
+            feed.backfill(user_id, author_id)
+            total += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Ленты заполнены по {total} подпискам'
+        ))
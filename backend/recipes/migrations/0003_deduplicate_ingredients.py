@@ -0,0 +1,33 @@
+from django.db import migrations
+from django.db.models import Count, Min
+
+
+def deduplicate_ingredients(apps, schema_editor):
+    """Склеивает дубликаты ингредиентов от повторных запусков импорта."""
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    IngredientsInRecipe = apps.get_model('recipes', 'IngredientsInRecipe')
+    duplicates = Ingredient.objects.values(
+        'name', 'measurement_unit'
+    ).annotate(keep_id=Min('id'), total=Count('id')).filter(total__gt=1)
+    for duplicate in duplicates.iterator():
+        extra_ids = Ingredient.objects.filter(
+            name=duplicate['name'],
+            measurement_unit=duplicate['measurement_unit'],
+        ).exclude(id=duplicate['keep_id']).values_list('id', flat=True)
+        IngredientsInRecipe.objects.filter(
+            ingredient_id__in=list(extra_ids)
+        ).update(ingredient_id=duplicate['keep_id'])
+        Ingredient.objects.filter(id__in=list(extra_ids)).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0002_all_model_migrations'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            deduplicate_ingredients, migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,35 @@
+from django.db import migrations
+
+INDEXES = (
+    ('recipe_name_upper_idx', 'recipes_recipe', 'name'),
+    ('ingredient_name_upper_idx', 'recipes_ingredient', 'name'),
+)
+
+
+def create_indexes(apps, schema_editor):
+    """Индексы под поиск по началу строки (istartswith) в PostgreSQL."""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, table, column in INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {name} ON {table} '
+            f'(UPPER({column}::text) text_pattern_ops)'
+        )
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, _, _ in INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
@@ -0,0 +1,58 @@
+import hashlib
+
+from django.db import migrations, transaction
+
+BATCH_SIZE = 1000
+
+
+def content_digest(name, text, cooking_time):
+    return hashlib.sha256(
+        f'{name}\0{text}\0{cooking_time}'.encode()
+    ).hexdigest()
+
+
+def backfill_content_hash(apps, schema_editor):
+    """Заполняет хэш содержимого пачками по возрастанию id.
+
+    Каждая пачка коммитится отдельно. Повторы старых рецептов остаются
+    без хэша, чтобы уникальный индекс можно было построить.
+    """
+    Recipe = apps.get_model('recipes', 'Recipe')
+    last_pk = 0
+    while True:
+        rows = list(Recipe.objects.filter(
+            pk__gt=last_pk, content_hash__isnull=True
+        ).order_by('pk').values_list(
+            'pk', 'name', 'text', 'cooking_time')[:BATCH_SIZE])
+        if not rows:
+            return
+        last_pk = rows[-1][0]
+        digests = {
+            pk: content_digest(name, text, cooking_time)
+            for pk, name, text, cooking_time in rows
+        }
+        taken = set(Recipe.objects.filter(
+            content_hash__in=digests.values()
+        ).values_list('content_hash', flat=True))
+        recipes = []
+        for pk, digest in digests.items():
+            if digest in taken:
+                continue
+            taken.add(digest)
+            recipes.append(Recipe(pk=pk, content_hash=digest))
+        with transaction.atomic():
+            Recipe.objects.bulk_update(recipes, ['content_hash'])
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('recipes', '0011_recipe_content_hash'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            backfill_content_hash, migrations.RunPython.noop
+        ),
+    ]
@@ -1,3 +1,6 @@
+import hashlib
+
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator
 from django.db import models
 
@@ -47,6 +50,12 @@ class Ingredient(models.Model):
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
         ordering = ('name',)
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name', 'measurement_unit'],
+                name='unique_ingredient'
+            )
+        ]
 
     def __str__(self):
         return f'{self.name} - {self.measurement_unit}'
@@ -88,15 +97,63 @@ class Recipe(models.Model):
         auto_now_add=True,
         verbose_name='Дата публикации',
     )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения',
+    )
+    version = models.PositiveIntegerField(
+        default=1,
+        verbose_name='Версия',
+    )
+    content_hash = models.CharField(
+        max_length=64,
+        unique=True,
+        null=True,
+        editable=False,
+        verbose_name='Хэш содержимого',
+    )
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ('-pub_date',)
+        indexes = [
+            models.Index(fields=['-pub_date'], name='recipe_pub_date_idx'),
+            models.Index(
+                fields=['author', '-pub_date'],
+                name='recipe_author_pub_date_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.name
 
+    @staticmethod
+    def content_digest(name, text, cooking_time):
+        """Хэш полей, по которым рецепты не должны повторяться."""
+        return hashlib.sha256(
+            f'{name}\0{text}\0{cooking_time}'.encode()
+        ).hexdigest()
+
+    def is_duplicate(self):
+        """Есть ли другой рецепт с тем же содержимым: один поиск по индексу."""
+        return Recipe.objects.filter(content_hash=self.content_digest(
+            self.name, self.text, self.cooking_time
+        )).exclude(pk=self.pk).exists()
+
+    def clean(self):
+        if self.is_duplicate():
+            raise ValidationError('Такой рецепт уже есть!')
+
+    def save(self, *args, **kwargs):
+        self.content_hash = self.content_digest(
+            self.name, self.text, self.cooking_time
+        )
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'content_hash'}
+        super().save(*args, **kwargs)
+
 
 class IngredientsInRecipe(models.Model):
     """Модель ингредиентов в рецепте."""
@@ -120,6 +177,12 @@ class IngredientsInRecipe(models.Model):
     class Meta:
         verbose_name = 'Ингредиент в рецепте'
         verbose_name_plural = 'Ингредиенты в рецептах'
+        indexes = [
+            models.Index(
+                fields=['recipe', 'ingredient', 'amount'],
+                name='recipe_ingredient_amount_idx'
+            ),
+        ]
 
     def __str__(self):
         return f'{self.recipe} - {self.ingredient} - {self.amount}'
@@ -139,6 +202,11 @@ class ShoppingCart(models.Model):
         on_delete=models.CASCADE,
         verbose_name='Рецепт',
     )
+    created = models.DateTimeField(
+        auto_now_add=True,
+        db_index=True,
+        verbose_name='Дата добавления',
+    )
 
     class Meta:
         verbose_name = 'Корзина'
@@ -165,6 +233,11 @@ class Favorite(models.Model):
         on_delete=models.CASCADE,
         verbose_name='Рецепт',
     )
+    created = models.DateTimeField(
+        auto_now_add=True,
+        db_index=True,
+        verbose_name='Дата добавления',
+    )
 
     class Meta:
         verbose_name = 'Избранное'
@@ -206,3 +279,132 @@ class Follow(models.Model):
                 name='unique_follower',
             ),
         ]
+        indexes = [
+            models.Index(
+                fields=['following', 'user'],
+                name='follow_following_user_idx'
+            ),
+        ]
+
+
+class RecipePopularity(models.Model):
+    """Модель рейтинга популярности рецептов."""
+    recipe = models.OneToOneField(
+        Recipe,
+        primary_key=True,
+        related_name='popularity',
+        on_delete=models.CASCADE,
+        verbose_name='Рецепт',
+    )
+    score = models.FloatField(
+        verbose_name='Рейтинг',
+    )
+    updated = models.DateTimeField(
+        verbose_name='Дата пересчёта',
+    )
+
+    class Meta:
+        verbose_name = 'Популярность рецепта'
+        verbose_name_plural = 'Популярность рецептов'
+        ordering = ('-score',)
+        indexes = [
+            models.Index(fields=['-score'], name='popularity_score_idx'),
+        ]
+
+
+class SimilarRecipe(models.Model):
+    """Модель похожих рецептов по общим ингредиентам."""
+    recipe = models.ForeignKey(
+        Recipe,
+        related_name='similar_recipes',
+        on_delete=models.CASCADE,
+        db_index=False,
+        verbose_name='Рецепт',
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        related_name='+',
+        on_delete=models.CASCADE,
+        verbose_name='Похожий рецепт',
+    )
+    score = models.FloatField(
+        verbose_name='Сходство',
+    )
+
+    class Meta:
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+        ordering = ('recipe', '-score')
+        indexes = [
+            models.Index(
+                fields=['recipe', '-score'],
+                name='similar_recipe_score_idx'
+            ),
+        ]
+
+
+class FeedEntry(models.Model):
+    """Модель ленты рецептов от авторов из подписок."""
+    user = models.ForeignKey(
+        User,
+        related_name='feed',
+        on_delete=models.CASCADE,
+        verbose_name='Подписчик',
+    )
+    author = models.ForeignKey(
+        User,
+        related_name='+',
+        on_delete=models.CASCADE,
+        db_index=False,
+        verbose_name='Автор',
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        related_name='feed_entries',
+        on_delete=models.CASCADE,
+        verbose_name='Рецепт',
+    )
+    pub_date = models.DateTimeField(
+        verbose_name='Дата публикации',
+    )
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Лента подписок'
+        ordering = ('-pub_date',)
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_recipe_in_feed'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date'],
+                name='feed_user_pub_date_idx'
+            ),
+            models.Index(
+                fields=['user', 'author'],
+                name='feed_user_author_idx'
+            ),
+        ]
+
+
+class PendingFanOut(models.Model):
+    """Очередь рецептов, которые ещё не разложены по лентам подписчиков."""
+    recipe = models.OneToOneField(
+        Recipe,
+        primary_key=True,
+        related_name='+',
+        on_delete=models.CASCADE,
+        verbose_name='Рецепт',
+    )
+    created = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Дата постановки в очередь',
+    )
+
+    class Meta:
+        verbose_name = 'Раскладка рецепта по лентам'
+        verbose_name_plural = 'Очередь раскладки по лентам'
+        ordering = ('created',)
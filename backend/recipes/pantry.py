@@ -0,0 +1,179 @@
+import os
+import threading
+import time
+from array import array
+from functools import reduce
+
+import numpy as np
+from django.conf import settings
+
+from .models import IngredientsInRecipe, Recipe
+from .versions import get_version
+
+VERSION = 'pantry'
+READ_CHUNK = 10000
+GROUP_FIELDS = ('keys', 'starts', 'values')
+
+
+def load_pairs(queryset, fields):
+    """Читает пары id из БД в два отсортированных массива numpy."""
+    left, right = array('q'), array('q')
+    rows = queryset.values_list(*fields).order_by()
+    for first, second in rows.iterator(chunk_size=READ_CHUNK):
+        left.append(first)
+        right.append(second)
+    pairs = np.unique(np.column_stack((
+        np.frombuffer(left, dtype=np.int64),
+        np.frombuffer(right, dtype=np.int64),
+    )).reshape(-1, 2), axis=0)
+    return pairs[:, 0], pairs[:, 1]
+
+
+def group(name, keys, values):
+    """Массивы name_keys, name_starts и name_values для файла индекса.
+
+    Значения ключа keys[i] лежат в values[starts[i]:starts[i + 1]],
+    пары должны быть отсортированы по ключу.
+    """
+    unique, starts = np.unique(keys, return_index=True)
+    arrays = (unique, np.append(starts, len(keys)), values)
+    return {
+        f'{name}_{field}': array for field, array in zip(GROUP_FIELDS, arrays)
+    }
+
+
+def build():
+    """Собирает индекс из БД и атомарно подменяет файл для воркеров.
+
+    Индекс помечается версией, прочитанной до выборки: если рецепты
+    изменятся во время сборки, версия сменится, и файл будет считаться
+    устаревшим до следующей сборки.
+    """
+    version = get_version(VERSION)
+    ingredients, recipes = load_pairs(
+        IngredientsInRecipe.objects.all(), ('ingredient_id', 'recipe_id')
+    )
+    tags, tagged = load_pairs(
+        Recipe.tags.through.objects.all(), ('tag_id', 'recipe_id')
+    )
+    unique, required = np.unique(recipes, return_counts=True)
+    path = settings.PANTRY_PATH
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'wb') as output:
+        np.savez(
+            output, version=np.array(version), recipes=unique,
+            required=required, **group('ingredients', ingredients, recipes),
+            **group('tags', tags, tagged),
+        )
+    os.replace(tmp, path)
+    return version
+
+
+def file_version():
+    """Версия индекса в файле или None, если файла нет."""
+    try:
+        with np.load(settings.PANTRY_PATH) as data:
+            return str(data['version'])
+    except OSError:
+        return None
+
+
+def is_stale():
+    return file_version() != get_version(VERSION)
+
+
+def postings(groups, pk):
+    """Отсортированные значения ключа pk или пустой массив."""
+    keys, starts, values = groups
+    position = np.searchsorted(keys, pk)
+    if position == len(keys) or keys[position] != pk:
+        return values[:0]
+    return values[starts[position]:starts[position + 1]]
+
+
+class PantryIndex:
+    """Инвертированный индекс ингредиент -> id рецептов из файла."""
+
+    def __init__(self, data):
+        self.version = str(data['version'])
+        self.recipes, self.required = data['recipes'], data['required']
+        self.postings, self.tags = (
+            tuple(data[f'{name}_{field}'] for field in GROUP_FIELDS)
+            for name in ('ingredients', 'tags')
+        )
+
+    def search(self, ingredient_ids, tag_ids=None, tags_mode='any'):
+        """Рецепты, отсортированные по доле имеющихся ингредиентов.
+
+        Возвращает массивы id рецептов, доли покрытия и числа
+        недостающих ингредиентов. Тэги отбирают рецепты с любым из
+        тэгов или, при tags_mode='all', со всеми сразу.
+        """
+        found = [postings(self.postings, pk) for pk in set(ingredient_ids)]
+        if not any(map(len, found)):
+            empty = np.array([], dtype=np.int64)
+            return empty, empty.astype(float), empty
+        recipes, hits = np.unique(np.concatenate(found), return_counts=True)
+        if tag_ids is not None:
+            tagged = [postings(self.tags, pk) for pk in set(tag_ids)]
+            if tags_mode == 'all':
+                allowed = reduce(np.intersect1d, tagged)
+            else:
+                allowed = np.concatenate(tagged)
+            mask = np.isin(recipes, allowed)
+            recipes, hits = recipes[mask], hits[mask]
+        required = self.required[np.searchsorted(self.recipes, recipes)]
+        coverage = hits / required
+        missing = required - hits
+        order = np.lexsort((recipes, missing, -coverage))
+        return recipes[order], coverage[order], missing[order]
+
+
+_index = None
+_checked = 0
+_lock = threading.Lock()
+
+
+def load_index(current):
+    """Индекс из файла или current, если файл тот же.
+
+    Файла нет только до первой сборки, тогда воркер собирает его сам.
+    """
+    try:
+        with np.load(settings.PANTRY_PATH) as data:
+            if (current is not None
+                    and current.version == str(data['version'])):
+                return current
+            return PantryIndex(data)
+    except OSError:
+        if current is not None:
+            return current
+    build()
+    with np.load(settings.PANTRY_PATH) as data:
+        return PantryIndex(data)
+
+
+def is_fresh(index, version):
+    return index is not None and (
+        index.version == version
+        or time.monotonic() - _checked < settings.PANTRY_INDEX_REFRESH
+    )
+
+
+def get_index():
+    """Индекс воркера из файла, который собирает команда build_pantry.
+
+    Запросы не читают таблицы рецептов: пока файл не пересобран после
+    изменений, воркер отдаёт загруженный индекс и проверяет файл не чаще
+    раза в PANTRY_INDEX_REFRESH секунд.
+    """
+    global _index, _checked
+    version = get_version(VERSION)
+    index = _index
+    if is_fresh(index, version):
+        return index
+    with _lock:
+        if not is_fresh(_index, version):
+            _index = load_index(_index)
+            _checked = time.monotonic()
+        return _index
@@ -0,0 +1,87 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Max
+from django.utils import timezone
+
+from .models import Favorite, RecipePopularity, ShoppingCart
+
+BATCH_SIZE = 1000
+# Событие старше этого числа периодов полураспада весит меньше 0.001.
+HALF_LIVES_KEPT = 10
+MIN_SCORE = 0.001
+
+
+def decay(age):
+    """Множитель затухания для события возрастом age."""
+    half_life = timedelta(hours=settings.POPULAR_HALF_LIFE_HOURS)
+    return 0.5 ** (age / half_life)
+
+
+def collect_scores(since, now):
+    """Суммирует затухающие веса событий за период (since, now]."""
+    scores = defaultdict(float)
+    sources = (
+        (Favorite, settings.POPULAR_FAVORITE_WEIGHT),
+        (ShoppingCart, settings.POPULAR_CART_WEIGHT),
+    )
+    for model, weight in sources:
+        events = model.objects.filter(
+            created__gt=since, created__lte=now
+        ).values_list('recipe_id', 'created').order_by().iterator(
+            chunk_size=BATCH_SIZE
+        )
+        for recipe_id, created in events:
+            scores[recipe_id] += weight * decay(now - created)
+    return scores
+
+
+def apply_scores(scores, now):
+    """Добавляет прирост рейтинга к таблице пачками."""
+    recipe_ids = list(scores)
+    for start in range(0, len(recipe_ids), BATCH_SIZE):
+        batch = recipe_ids[start:start + BATCH_SIZE]
+        existing = RecipePopularity.objects.in_bulk(batch)
+        to_update, to_create = [], []
+        for recipe_id in batch:
+            row = existing.get(recipe_id)
+            if row is None:
+                to_create.append(RecipePopularity(
+                    recipe_id=recipe_id, score=scores[recipe_id], updated=now
+                ))
+            else:
+                row.score += scores[recipe_id]
+                to_update.append(row)
+        RecipePopularity.objects.bulk_update(to_update, ['score'])
+        RecipePopularity.objects.bulk_create(to_create)
+
+
+def rebuild(full=False):
+    """Пересчитывает рейтинг популярности.
+
+    Инкрементальный пересчёт состаривает все рейтинги одним UPDATE и
+    добавляет только события после прошлого запуска. Граница пересчёта
+    отстаёт от текущего времени на POPULAR_SETTLE_SECONDS, чтобы
+    событие, записанное ещё не закоммиченной транзакцией, попало
+    в следующий запуск, а не потерялось. Удаления из избранного
+    и корзины учитывает только полный пересчёт.
+    """
+    now = timezone.now() - timedelta(seconds=settings.POPULAR_SETTLE_SECONDS)
+    last = RecipePopularity.objects.aggregate(last=Max('updated'))['last']
+    with transaction.atomic():
+        if full or last is None:
+            RecipePopularity.objects.all().delete()
+            since = now - timedelta(
+                hours=settings.POPULAR_HALF_LIFE_HOURS * HALF_LIVES_KEPT
+            )
+        else:
+            RecipePopularity.objects.update(
+                score=F('score') * decay(now - last), updated=now
+            )
+            RecipePopularity.objects.filter(score__lt=MIN_SCORE).delete()
+            since = last
+        scores = collect_scores(since, now)
+        apply_scores(scores, now)
+    return len(scores)
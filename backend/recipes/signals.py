@@ -0,0 +1,96 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import catalog, feed, lookups, pantry, snapshots
+from .models import Follow, Ingredient, IngredientsInRecipe, Recipe, Tag
+from .versions import bump_on_commit
+
+
+def touch_recipes(recipe_ids):
+    """Поднимает версию и дату изменения рецептов одним UPDATE."""
+    Recipe.objects.filter(pk__in=recipe_ids).update(
+        version=F('version') + 1, updated_at=timezone.now()
+    )
+
+
+def touch_recipe(recipe):
+    # Сериализатор рецептов сам поднимает версию один раз на запрос.
+    if not getattr(recipe, '_version_bumped', False):
+        touch_recipes([recipe.pk])
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_created(sender, instance, created, **kwargs):
+    if created:
+        feed.enqueue_fan_out(instance)
+    else:
+        touch_recipe(instance)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(partial(
+            feed.backfill, instance.user_id, instance.following_id
+        ))
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    transaction.on_commit(partial(
+        feed.prune, instance.user_id, instance.following_id
+    ))
+
+
+@receiver(post_save, sender=IngredientsInRecipe)
+@receiver(post_delete, sender=IngredientsInRecipe)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_composition_changed(sender, instance, **kwargs):
+    if not kwargs.get('action', 'post_').startswith('post_'):
+        return
+    bump_on_commit(pantry.VERSION)
+    if isinstance(instance, IngredientsInRecipe):
+        touch_recipes([instance.recipe_id])
+    elif not kwargs['reverse']:
+        touch_recipe(instance)
+    elif kwargs['pk_set']:
+        touch_recipes(kwargs['pk_set'])
+
+
+def on_commit_once(func):
+    """Выполняет func после коммита один раз на транзакцию.
+
+    Запланированные функции хранит само соединение, при откате
+    транзакции или точки сохранения Django убирает их оттуда. Повтор
+    пропускается, только если func запланирована на том же или внешнем
+    уровне вложенности: такой вызов откатится вместе с текущим
+    изменением.
+    """
+    connection = transaction.get_connection()
+    savepoints = set(connection.savepoint_ids)
+    for scheduled_in, scheduled in connection.run_on_commit:
+        if scheduled is func and scheduled_in <= savepoints:
+            return
+    transaction.on_commit(func)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def tag_changed(sender, **kwargs):
+    bump_on_commit(lookups.TAGS_VERSION)
+    on_commit_once(catalog.build)
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def ingredient_changed(sender, **kwargs):
+    # Массовое редактирование в одной транзакции пересобирает снимки
+    # один раз после коммита.
+    on_commit_once(snapshots.build_ingredients)
+    on_commit_once(catalog.build)
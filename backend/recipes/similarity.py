@@ -0,0 +1,103 @@
+from array import array
+
+import numpy as np
+from django.db import transaction
+from scipy import sparse
+
+from .models import IngredientsInRecipe, SimilarRecipe
+
+READ_CHUNK = 10000
+
+
+def load_matrix():
+    """Строит бинарную разреженную матрицу рецепт x ингредиент."""
+    recipe_ids, ingredient_ids = array('q'), array('q')
+    pairs = IngredientsInRecipe.objects.values_list(
+        'recipe_id', 'ingredient_id').order_by().iterator(
+        chunk_size=READ_CHUNK)
+    for recipe_id, ingredient_id in pairs:
+        recipe_ids.append(recipe_id)
+        ingredient_ids.append(ingredient_id)
+    recipes, rows = np.unique(
+        np.frombuffer(recipe_ids, dtype=np.int64), return_inverse=True
+    )
+    _, cols = np.unique(
+        np.frombuffer(ingredient_ids, dtype=np.int64), return_inverse=True
+    )
+    matrix = sparse.csr_matrix(
+        (np.ones(len(rows), dtype=np.float32), (rows, cols))
+    )
+    matrix.sum_duplicates()
+    matrix.data[:] = 1
+    return recipes, matrix
+
+
+def top_neighbors(matrix, candidates, sizes, start, stop, top_k, metric,
+                  min_score):
+    """Считает top-K соседей для строк [start, stop).
+
+    Пары кандидатов выбираются по урезанной матрице candidates, а их
+    пересечение считается по полной matrix, чтобы оценка учитывала
+    все ингредиенты рецептов.
+    """
+    pairs = (candidates[start:stop] @ candidates.T).tocsr()
+    rows = np.repeat(np.arange(start, stop), np.diff(pairs.indptr))
+    cols = pairs.indices
+    overlap = np.asarray(
+        matrix[rows].multiply(matrix[cols]).sum(axis=1), dtype=np.float32
+    ).ravel()
+    if metric == 'jaccard':
+        scores = overlap / (sizes[rows] + sizes[cols] - overlap)
+    else:
+        scores = overlap / np.sqrt(sizes[rows] * sizes[cols])
+    scores[rows == cols] = 0
+    for offset in range(stop - start):
+        begin, end = pairs.indptr[offset], pairs.indptr[offset + 1]
+        row_scores = scores[begin:end]
+        if len(row_scores) > top_k:
+            best = np.argpartition(-row_scores, top_k)[:top_k]
+        else:
+            best = np.arange(len(row_scores))
+        best = best[row_scores[best] >= min_score]
+        best = best[np.argsort(-row_scores[best])]
+        yield start + offset, cols[begin:end][best], row_scores[best]
+
+
+def build(top_k=10, metric='jaccard', max_df=0.1, min_score=0.05,
+          block_size=2000):
+    """Пересчитывает таблицу похожих рецептов блоками строк.
+
+    Ингредиенты, которые встречаются больше чем в доле max_df рецептов
+    (соль, вода), не участвуют в поиске кандидатов: иначе произведение
+    матриц становится почти плотным. Пересечение найденных пар и
+    размеры рецептов для метрики считаются по полному набору.
+    """
+    recipes, matrix = load_matrix()
+    if not len(recipes):
+        SimilarRecipe.objects.all().delete()
+        return 0
+    sizes = np.asarray(matrix.getnnz(axis=1), dtype=np.float32)
+    document_frequency = matrix.getnnz(axis=0)
+    keep = document_frequency <= max(max_df * len(recipes), 2)
+    candidates = matrix[:, np.flatnonzero(keep)].tocsr()
+
+    for start in range(0, len(recipes), block_size):
+        stop = min(start + block_size, len(recipes))
+        rows = [
+            SimilarRecipe(
+                recipe_id=int(recipes[row]),
+                similar_id=int(recipes[col]),
+                score=float(score),
+            )
+            for row, cols, scores in top_neighbors(
+                matrix, candidates, sizes, start, stop, top_k, metric,
+                min_score,
+            )
+            for col, score in zip(cols, scores)
+        ]
+        with transaction.atomic():
+            SimilarRecipe.objects.filter(
+                recipe_id__in=recipes[start:stop].tolist()
+            ).delete()
+            SimilarRecipe.objects.bulk_create(rows, batch_size=READ_CHUNK)
+    return len(recipes)
@@ -0,0 +1,57 @@
+import gzip
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import brotli
+from django.conf import settings
+
+from .models import Ingredient
+
+INGREDIENTS = 'ingredients'
+KEEP_VERSIONS = 3
+
+
+def write_atomic(path, content):
+    tmp = path.with_name(f'.{path.name}.tmp')
+    tmp.write_bytes(content)
+    os.replace(tmp, path)
+
+
+def write_variants(root, name, content):
+    """Пишет файл вместе с заранее сжатыми .gz и .br рядом."""
+    write_atomic(root / name, content)
+    write_atomic(
+        root / f'{name}.gz', gzip.compress(content, compresslevel=9, mtime=0)
+    )
+    write_atomic(
+        root / f'{name}.br', brotli.compress(content, quality=11)
+    )
+
+
+def build_ingredients():
+    """Собирает статический снимок справочника ингредиентов.
+
+    Содержимое совпадает с ответом GET /api/ingredients/ без фильтров.
+    Рядом с версионным ingredients.<версия>.json обновляется
+    ingredients.json, который nginx отдаёт вместо запроса в Django.
+    """
+    root = Path(settings.SNAPSHOT_ROOT)
+    root.mkdir(parents=True, exist_ok=True)
+    content = json.dumps(
+        list(Ingredient.objects.values('id', 'name', 'measurement_unit')),
+        ensure_ascii=False, separators=(',', ':'),
+    ).encode()
+    version = hashlib.sha256(content).hexdigest()[:12]
+    write_variants(root, f'{INGREDIENTS}.{version}.json', content)
+    write_variants(root, f'{INGREDIENTS}.json', content)
+
+    versions = sorted(
+        root.glob(f'{INGREDIENTS}.*.json'),
+        key=lambda path: path.stat().st_mtime, reverse=True
+    )
+    for old in versions[KEEP_VERSIONS:]:
+        for path in (old, Path(f'{old}.gz'), Path(f'{old}.br')):
+            path.unlink(missing_ok=True)
+    return version
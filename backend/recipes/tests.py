@@ -0,0 +1,185 @@
+import json
+import tempfile
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from . import catalog, lookups, ranking, similarity, snapshots
+from .lookups import get_tag_map
+from .models import (Favorite, Ingredient, IngredientsInRecipe, Recipe,
+                     RecipePopularity, SimilarRecipe, Tag)
+from .versions import get_version
+
+User = get_user_model()
+
+
+class CatalogRebuildTest(TestCase):
+    """Каталог пересобирается после коммита, даже если до этого был откат."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(
+            CATALOG_PATH=f'{directory.name}/catalog.bin',
+            CACHES={'default': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            }},
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        catalog.build()
+
+    def test_rebuild_after_rollback(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    Tag.objects.create(
+                        name='Завтрак', color='#FF0000', slug='breakfast'
+                    )
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+            Tag.objects.create(name='Ужин', color='#00FF00', slug='dinner')
+        self.assertIn('dinner', get_tag_map())
+        self.assertNotIn('breakfast', get_tag_map())
+
+    def test_rebuild_once_per_transaction(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            Tag.objects.create(name='Обед', color='#0000FF', slug='lunch')
+            Tag.objects.create(name='Ужин', color='#00FF00', slug='dinner')
+        self.assertEqual(callbacks.count(catalog.build), 1)
+
+    def test_tags_version_bumped_after_commit(self):
+        version = get_version(lookups.TAGS_VERSION)
+        with self.captureOnCommitCallbacks(execute=True):
+            Tag.objects.create(name='Обед', color='#0000FF', slug='lunch')
+            self.assertEqual(get_version(lookups.TAGS_VERSION), version)
+        self.assertNotEqual(get_version(lookups.TAGS_VERSION), version)
+
+
+class IngredientsSnapshotTest(TestCase):
+    """Снимок ингредиентов пересобирается после отката и коммита."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = Path(directory.name)
+        settings = override_settings(
+            SNAPSHOT_ROOT=directory.name,
+            CATALOG_PATH=f'{directory.name}/catalog.bin',
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        snapshots.build_ingredients()
+
+    def test_rebuild_after_rollback(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    Ingredient.objects.create(
+                        name='соль', measurement_unit='г'
+                    )
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+            Ingredient.objects.create(name='сахар', measurement_unit='г')
+        names = [
+            ingredient['name'] for ingredient in json.loads(
+                (self.root / f'{snapshots.INGREDIENTS}.json').read_text()
+            )
+        ]
+        self.assertEqual(names, ['сахар'])
+
+
+class SimilarRecipesTest(TestCase):
+    """Сходство считается по всем ингредиентам, а не только по редким."""
+
+    def setUp(self):
+        author = User.objects.create(username='author', email='a@a.ru')
+        ingredients = {
+            name: Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('соль', 'мука', 'яйца', 'молоко', 'сахар', 'рис')
+        }
+        compositions = {
+            'блины': ('соль', 'мука', 'яйца', 'молоко', 'сахар'),
+            'оладьи': ('соль', 'мука', 'яйца', 'молоко'),
+            'каша': ('соль', 'рис'),
+            'плов': ('соль', 'рис', 'сахар'),
+        }
+        self.recipes = {}
+        for name, composition in compositions.items():
+            recipe = Recipe.objects.create(
+                author=author, name=name, text=name, cooking_time=10,
+                image='recipes/images/test.png',
+            )
+            IngredientsInRecipe.objects.bulk_create([
+                IngredientsInRecipe(
+                    recipe=recipe, ingredient=ingredients[ingredient],
+                    amount=1,
+                )
+                for ingredient in composition
+            ])
+            self.recipes[name] = recipe.pk
+
+    def scores(self, name):
+        return dict(SimilarRecipe.objects.filter(
+            recipe_id=self.recipes[name]
+        ).values_list('similar_id', 'score'))
+
+    def test_jaccard_over_full_sets(self):
+        similarity.build(max_df=0.1, min_score=0.05)
+        scores = self.scores('оладьи')
+        # Соль есть во всех рецептах и не участвует в поиске кандидатов,
+        # но входит в пересечение найденной пары.
+        self.assertAlmostEqual(scores[self.recipes['блины']], 4 / 5)
+        self.assertNotIn(self.recipes['каша'], scores)
+        self.assertAlmostEqual(
+            self.scores('каша')[self.recipes['плов']], 2 / 3, places=6
+        )
+
+    def test_cosine_over_full_sets(self):
+        similarity.build(metric='cosine', max_df=0.1, min_score=0.05)
+        self.assertAlmostEqual(
+            self.scores('оладьи')[self.recipes['блины']],
+            4 / (4 * 5) ** 0.5, places=6,
+        )
+
+
+class PopularityRankingTest(TestCase):
+    """Инкрементальный пересчёт не теряет поздно закоммиченные события."""
+
+    def test_event_committed_after_run(self):
+        user = User.objects.create(username='user', email='u@u.ru')
+        recipe, ranked = (
+            Recipe.objects.create(
+                author=user, name=name, text=name, cooking_time=10,
+                image='recipes/images/test.png',
+            )
+            for name in ('Суп', 'Каша')
+        )
+        start = timezone.now()
+        # Рейтинг уже есть, поэтому следующий запуск будет
+        # инкрементальным.
+        Favorite.objects.create(user=user, recipe=ranked)
+        Favorite.objects.update(created=start - timedelta(hours=1))
+        with mock.patch.object(ranking.timezone, 'now', return_value=start):
+            ranking.rebuild(full=True)
+        # Время события поставлено до запуска, а строка стала видна
+        # только после него.
+        favorite = Favorite.objects.create(user=user, recipe=recipe)
+        Favorite.objects.filter(pk=favorite.pk).update(
+            created=start - timedelta(seconds=5)
+        )
+        with mock.patch.object(
+                ranking.timezone, 'now',
+                return_value=start + timedelta(minutes=5)):
+            ranking.rebuild()
+        self.assertEqual(
+            set(RecipePopularity.objects.values_list('recipe', flat=True)),
+            {recipe.pk, ranked.pk},
+        )
@@ -0,0 +1,43 @@
+from functools import partial
+from uuid import uuid4
+
+from django.core.cache import cache
+from django.db import transaction
+
+KEY = 'version:{}'
+
+
+def get_version(name):
+    """Текущая версия набора данных, общая для всех воркеров."""
+    version = cache.get(KEY.format(name))
+    if version is None:
+        version = bump_version(name)
+    return version
+
+
+def bump_version(name):
+    """Помечает набор данных изменённым: кэши со старой версией устарели."""
+    return set_version(name, uuid4().hex)
+
+
+def bump_on_commit(*names):
+    # Версия меняется после коммита, иначе параллельный запрос успеет
+    # закэшировать старые данные под новой версией.
+    for name in names:
+        transaction.on_commit(partial(bump_version, name))
+
+
+def set_version(name, version):
+    cache.set(KEY.format(name), version, None)
+    return version
+
+
+def get_versions(names):
+    """Версии нескольких наборов данных одним обращением к кэшу."""
+    keys = {KEY.format(name): name for name in names}
+    versions = {
+        keys[key]: version for key, version in cache.get_many(keys).items()
+    }
+    for name in set(keys.values()) - versions.keys():
+        versions[name] = bump_version(name)
+    return versions
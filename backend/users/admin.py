@@ -1,18 +1,58 @@
 from django.contrib import admin
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 
+from recipes.models import Follow
+from recipes.paginators import EstimatedCountPaginator
+
+from . import deletion
 from .models import User
 
 
 class UserAdmin(admin.ModelAdmin):
     """Админка пользователей."""
     list_display = ('username', 'email', 'first_name',
-                    'last_name', 'follow_amount')
-    search_fields = ('username',)
-    list_filter = ('username', 'email')
+                    'last_name', 'follow_amount', 'deletion_requested')
+    search_fields = ('^username', '^email')
+    list_filter = ('is_staff', 'is_active')
+    readonly_fields = ('deletion_requested',)
     empty_value_display = '-пусто-'
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        followers = Follow.objects.filter(
+            following=OuterRef('pk')
+        ).order_by().values('following').annotate(amount=Count('pk'))
+        return super().get_queryset(request).annotate(
+            followers_amount=Coalesce(
+                Subquery(followers.values('amount')), 0
+            )
+        )
 
     def follow_amount(self, obj):
-        return obj.following.count()
+        return obj.followers_amount
+    follow_amount.admin_order_field = 'followers_amount'
+
+    def get_deleted_objects(self, objs, request):
+        # Сборщик связанных объектов для страницы подтверждения обходит
+        # всю историю пользователя, поэтому показываем только аккаунты.
+        perms_needed = set()
+        if not self.has_delete_permission(request):
+            perms_needed.add(self.opts.verbose_name)
+        return (
+            [str(obj) for obj in objs],
+            {self.opts.verbose_name_plural: len(objs)},
+            perms_needed,
+            [],
+        )
+
+    def delete_model(self, request, obj):
+        deletion.request_deletion(obj)
+
+    def delete_queryset(self, request, queryset):
+        for user in queryset:
+            deletion.request_deletion(user)
 
 
 admin.site.register(User, UserAdmin)
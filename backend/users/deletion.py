@@ -0,0 +1,125 @@
+import logging
+import time
+from functools import partial
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from recipes import pantry
+from recipes.models import (Favorite, FeedEntry, Follow, IngredientsInRecipe,
+                            PendingFanOut, Recipe, RecipePopularity,
+                            ShoppingCart, SimilarRecipe)
+from recipes.versions import bump_version
+
+from .models import User
+
+logger = logging.getLogger(__name__)
+
+
+def delete_in_batches(queryset):
+    """Удаляет строки пачками по первичному ключу без сборщика Django.
+
+    Каждая пачка — отдельная короткая транзакция, поэтому блокировки
+    держатся недолго и другие запросы на запись не ждут.
+    """
+    deleted = 0
+    ids = queryset.order_by().values_list('pk', flat=True)
+    while True:
+        batch = list(ids[:settings.DELETION_BATCH_SIZE])
+        if not batch:
+            return deleted
+        with transaction.atomic():
+            rows = queryset.model.objects.filter(pk__in=batch)
+            deleted += rows._raw_delete(rows.db)
+        time.sleep(settings.DELETION_PAUSE)
+
+
+def recipe_children(recipe_ids):
+    return (
+        IngredientsInRecipe.objects.filter(recipe_id__in=recipe_ids),
+        Recipe.tags.through.objects.filter(recipe_id__in=recipe_ids),
+        Favorite.objects.filter(recipe_id__in=recipe_ids),
+        ShoppingCart.objects.filter(recipe_id__in=recipe_ids),
+        FeedEntry.objects.filter(recipe_id__in=recipe_ids),
+        SimilarRecipe.objects.filter(recipe_id__in=recipe_ids),
+        SimilarRecipe.objects.filter(similar_id__in=recipe_ids),
+        RecipePopularity.objects.filter(recipe_id__in=recipe_ids),
+        PendingFanOut.objects.filter(recipe_id__in=recipe_ids),
+    )
+
+
+def delete_files(names):
+    """Удаляет картинки, на которые больше не ссылается ни один рецепт."""
+    used = set(Recipe.objects.filter(
+        image__in=names).values_list('image', flat=True))
+    for name in set(names) - used:
+        try:
+            default_storage.delete(name)
+        except OSError:
+            logger.exception('Не удалось удалить файл %s', name)
+
+
+def delete_recipes(recipe_ids):
+    for queryset in recipe_children(recipe_ids):
+        delete_in_batches(queryset)
+    with transaction.atomic():
+        # Строки, добавленные к рецептам, пока удалялись пачки.
+        for queryset in recipe_children(recipe_ids):
+            queryset._raw_delete(queryset.db)
+        recipes = Recipe.objects.filter(pk__in=recipe_ids)
+        images = [name for name in recipes.values_list(
+            'image', flat=True) if name]
+        recipes._raw_delete(recipes.db)
+        transaction.on_commit(partial(delete_files, images))
+
+
+def delete_user(user):
+    """Удаляет пользователя и всё, что с ним связано, пачками.
+
+    Прерванное удаление можно повторить: каждый шаг удаляет то, что
+    осталось в БД.
+    """
+    for queryset in (
+        Favorite.objects.filter(user=user),
+        ShoppingCart.objects.filter(user=user),
+        Follow.objects.filter(user=user),
+        Follow.objects.filter(following=user),
+        FeedEntry.objects.filter(user=user),
+    ):
+        delete_in_batches(queryset)
+    recipes = Recipe.objects.filter(author=user).order_by().values_list(
+        'pk', flat=True)
+    while True:
+        recipe_ids = list(recipes[:settings.DELETION_RECIPE_BATCH_SIZE])
+        if not recipe_ids:
+            break
+        delete_recipes(recipe_ids)
+    # Остались токен, группы и права — с ними справится обычный delete.
+    user.delete()
+    bump_version(pantry.VERSION)
+
+
+def process_pending(limit=None):
+    """Удаляет пользователей, для которых запрошено удаление."""
+    users = User.objects.filter(
+        deletion_requested__isnull=False).order_by('deletion_requested')
+    processed = 0
+    for user in users[:limit]:
+        delete_user(user)
+        processed += 1
+    return processed
+
+
+def request_deletion(user):
+    """Сразу скрывает пользователя и ставит его в очередь на удаление.
+
+    Очередь — пользователи с заполненным deletion_requested, её
+    разбирает команда process_deletions, запускаемая по расписанию.
+    """
+    user.deletion_requested = timezone.now()
+    user.is_active = False
+    user.save(update_fields=['deletion_requested', 'is_active'])
+    Token.objects.filter(user=user).delete()
@@ -0,0 +1,19 @@
+from django.core.management import BaseCommand
+
+from users import deletion
+
+
+class Command(BaseCommand):
+    help = 'Удаление пользователей, для которых запрошено удаление'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit', type=int,
+            help='Сколько пользователей удалить за запуск'
+        )
+
+    def handle(self, **options):
+        total = deletion.process_pending(options['limit'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено пользователей: {total}'
+        ))
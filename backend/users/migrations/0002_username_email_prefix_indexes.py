@@ -0,0 +1,35 @@
+from django.db import migrations
+
+INDEXES = (
+    ('user_username_upper_idx', 'username'),
+    ('user_email_upper_idx', 'email'),
+)
+
+
+def create_indexes(apps, schema_editor):
+    """Индексы под поиск по началу строки (istartswith) в PostgreSQL."""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, column in INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {name} ON users_user '
+            f'(UPPER({column}::text) text_pattern_ops)'
+        )
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, _ in INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_all_model_migrations'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
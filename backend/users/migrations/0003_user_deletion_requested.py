@@ -0,0 +1,18 @@
+# Generated by Django 3.2.3 on 2026-10-19 09:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_username_email_prefix_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='deletion_requested',
+            field=models.DateTimeField(blank=True, db_index=True, null=True, verbose_name='Запрошено удаление'),
+        ),
+    ]
@@ -22,6 +22,12 @@ class User(AbstractUser):
         max_length=150,
         verbose_name='Фамилия',
     )
+    deletion_requested = models.DateTimeField(
+        null=True,
+        blank=True,
+        db_index=True,
+        verbose_name='Запрошено удаление',
+    )
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']
@@ -0,0 +1,19 @@
+#!/bin/sh
+# Ключ для заголовка X-Cache-Refresh в map микрокэша. Без
+# CACHE_PURGE_TOKEN файл остаётся пустым, и заголовок ничего не обходит.
+set -eu
+
+target=/etc/nginx/cache_refresh_token.conf
+: > "$target"
+token="${CACHE_PURGE_TOKEN:-}"
+if [ -z "$token" ]; then
+    echo "$0: CACHE_PURGE_TOKEN не задан, обновление микрокэша выключено"
+    exit 0
+fi
+case "$token" in
+    *[!A-Za-z0-9_-]*)
+        echo "$0: CACHE_PURGE_TOKEN может содержать только A-Z, a-z, 0-9, _ и -" >&2
+        exit 1
+        ;;
+esac
+echo "\"$token\" 1;" > "$target"